@@ -37,7 +37,7 @@ INSTALLED_APPS = [
     'django.contrib.sessions',
     'django.contrib.messages',
     'django.contrib.staticfiles',
-    'crypto_track',
+    'crypto_track.apps.CryptoTrackConfig',
     'django_extensions',
 ]
 
@@ -79,9 +79,19 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': os.path.join(BASE_DIR, 'db.sqlite3'),
-    }
+        # worker processes of a full signal recompute (crypto_track/recompute.py) wait for each other's writes.
+        'OPTIONS': {'timeout': 60},
+    },
+    # Snapshot of default published at the end of each load/update (crypto_track/db_router.py), read-only views are served from it.
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.path.join(BASE_DIR, 'db_replica.sqlite3'),
+        'TEST': {'MIRROR': 'default'},
+    },
 }
 
+DATABASE_ROUTERS = ['crypto_track.db_router.ReplicaRouter']
+
 
 # Password validation
 # https://docs.djangoproject.com/en/2.1/ref/settings/#auth-password-validators
@@ -120,3 +130,34 @@ USE_TZ = True
 # https://docs.djangoproject.com/en/2.1/howto/static-files/
 
 STATIC_URL = '/static/'
+
+
+# Disk cache for Nomics and Google Trends responses (crypto_track/response_cache.py)
+# Set RESPONSE_CACHE_DIR = None to disable it.
+
+RESPONSE_CACHE_DIR = os.path.join(BASE_DIR, 'response_cache')
+RESPONSE_CACHE_MAX_BYTES = 500 * 1024 * 1024
+RESPONSE_CACHE_TTL = 60 * 60
+
+
+# Cache for GET /<simulation_id>/signal responses (crypto_track/signal_cache.py). Any Django cache backend works, entries are invalidated by SignalVersion.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'crypto_signal',
+    }
+}
+SIGNAL_CACHE_ALIAS = 'default'
+
+
+# Memory-mapped columnar copy of the candles of each market (crypto_track/candle_store.py)
+
+CANDLE_STORE_DIR = os.path.join(BASE_DIR, 'candle_store')
+
+
+# Coarser intervals materialized whenever candles of a base interval are written (crypto_track/rollup.py)
+
+ROLLUP_INTERVALS = {'1m': ['1h', '4h', '1d'],
+                    '1h': ['4h', '1d'],
+                    }
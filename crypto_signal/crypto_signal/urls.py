@@ -26,11 +26,18 @@ urlpatterns = [
     path('', views.SimulationView.as_view(), name='home'),
     path('admin/', admin.site.urls),
     path('load/nomics', views.load_nomics, name='load_nomics'),
+    path('load/nomics/batch', views.load_nomics_batch, name='load_nomics_batch'),
     path('load/ccxt', views.load_ccxt, name='load_ccxt'),
     path('load/trends', views.load_trends, name='load_trends'),
     path('<int:simulation_id>/signal', views.signal, name='signal'),
+    path('signal/range', views.signal_range, name='signal_range'),
+    path('<int:simulation_id>/bank', views.bank, name='bank'),
+    path('<int:simulation_id>/sweep', views.sweep, name='sweep'),
+    path('cache/stats', views.cache_stats, name='cache_stats'),
     path('update/candles', views.update_candles, name='update_candles'),
+    path('update/rollups', views.update_rollups, name='update_rollups'),
     path('update/<int:simulation_id>/signal', views.update_signal, name='update_signal'),
+    path('update/signal', views.update_signal, name='update_signal_all'),
     path('load/simulations', views.load_simulations, name='load_simulations'),
     path('export', views.data_export, name='data_export'),
 ]
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class CryptoTrackConfig(AppConfig):
     name = 'crypto_track'
+
+    def ready(self):
+        # connects the rollup and signal version receivers to candles_written (and to Simulation deletes)
+        from crypto_track import rollup, signal_cache
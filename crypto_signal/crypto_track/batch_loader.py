@@ -0,0 +1,130 @@
+from crypto_track.crypto_data import CryptoData
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import requests
+import threading
+import time
+
+
+class RateLimiter():
+    '''
+        Spaces out calls shared between threads so we never go over the given number of calls per second.
+
+        Attributes:
+            calls_per_second (float): maximum request rate. 0 or None disables the limit.
+    '''
+
+    def __init__(self, calls_per_second):
+        self.interval = 1.0 / calls_per_second if calls_per_second else 0.0
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
+
+    def wait(self):
+        '''
+            Blocks until the caller is allowed to send its request.
+        '''
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        if slot > now:
+            time.sleep(slot - now)
+
+
+class NomicsBatchLoader():
+    '''
+        Loads Nomics candles for several currencies at once. HTTP requests run concurrently on a shared pooled session, the results are written one currency at a time from the calling thread (SQLite only allows one writer).
+
+        Attributes:
+            Required:
+                currencies (list of str): cryptocurrencies to load
+            Optional:
+                options (dict): same params as /load/nomics (mode, start, end, interval). Default mode = incremental
+                max_workers (int): maximum number of requests in flight. Default = 8
+                calls_per_second (float): shared limit across all workers. Default = 4
+                retries (int): retries per request on connection errors and 429/5xx responses, with exponential backoff. Default = 5
+                backoff_factor (float): backoff base in seconds. Default = 0.5
+    '''
+
+    def __init__(self,
+                 currencies,
+                 options=None,
+                 max_workers=8,
+                 calls_per_second=4,
+                 retries=5,
+                 backoff_factor=0.5
+                 ):
+
+        self.currencies = currencies
+        self.options = options if options is not None else {'mode': 'incremental'}
+        self.max_workers = max_workers
+        self.rate_limiter = RateLimiter(calls_per_second)
+        self.session = self.create_session(retries, backoff_factor)
+
+    def create_session(self, retries, backoff_factor):
+        '''
+            Creates requests.Session with a connection pool big enough for every worker and retry/backoff on transient errors.
+        '''
+        retry = Retry(total=retries,
+                      backoff_factor=backoff_factor,
+                      status_forcelist=[429, 500, 502, 503, 504]
+                      )
+        adapter = HTTPAdapter(pool_connections=self.max_workers,
+                              pool_maxsize=self.max_workers,
+                              max_retries=retry
+                              )
+        session = requests.Session()
+        session.mount('https://', adapter)
+        session.mount('http://', adapter)
+        return session
+
+    def fetch(self, my_data, url):
+        '''
+            Runs in worker threads, must not touch the database. Cached responses skip the rate limiter.
+
+            Return value:
+            Tuple of (records, seconds spent on this currency's request).
+        '''
+        started = time.monotonic()
+        records = my_data.fetch_nomics(url, rate_limiter=self.rate_limiter)
+        return records, time.monotonic() - started
+
+    def load(self):
+        '''
+            Fetches all currencies concurrently and writes each one as soon as its response arrives.
+
+            Return value:
+            Dictionary of currency: result, where result has inserted/updated counts and seconds spent, or the error raised.
+        '''
+        results = {}
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            pending = {}
+            for currency in self.currencies:
+                my_data = CryptoData(currency=currency,
+                                     period_interval=self.options.get('interval', '1d'),
+                                     options=self.options,
+                                     session=self.session)
+                # urls are built here because incremental mode reads the stored watermark from the database.
+                url, source = my_data.build_nomics_url()
+                future = executor.submit(self.fetch, my_data, url)
+                pending[future] = (my_data, source)
+
+            for future in as_completed(pending):
+                my_data, source = pending[future]
+                try:
+                    records, fetch_seconds = future.result()
+                    started = time.monotonic()
+                    inserted, updated = my_data.write_bulk(records, source)
+                except Exception as exc:
+                    results[my_data.currency] = {"status": "Conflict",
+                                                 "type": type(exc).__name__,
+                                                 "message": exc.__str__()}
+                else:
+                    results[my_data.currency] = {"status": "Accepted",
+                                                 "inserted": inserted,
+                                                 "updated": updated,
+                                                 # time spent fetching and writing this currency only
+                                                 "seconds": round(fetch_seconds + time.monotonic() - started, 3)}
+        return results
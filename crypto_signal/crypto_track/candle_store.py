@@ -0,0 +1,237 @@
+from crypto_track.models import CryptoCandle, PyTrends
+from django.conf import settings
+import numpy as np
+import pandas as pd
+import contextlib
+import decimal
+import fcntl
+import json
+import os
+import tempfile
+import threading
+
+
+class CandleStore():
+    '''
+        Columnar copy of the candles of one market (currency, quote, interval, source) kept in memory-mapped NumPy files, so forecasting, signals and exports can read whole series without building a model instance per candle.
+        Every column is a raw file of fixed-size values plus a meta.json with the number of rows. Rows are ordered by period_start and rewritten from a given timestamp on refresh, so new candles are appended in place.
+
+        Attributes (align with CryptoCandle model):
+            Required:
+                currency (str): cryptocurrency being tracked
+            Optional:
+                currency_quoted (str): currency used for the prices. Default = USD
+                period_interval (str): Time interval of the candle. Default 1d = 1 day (daily)
+                source (str): CryptoCandle.source key. Default = nomics
+                directory (str): where stores are kept. Default = settings.CANDLE_STORE_DIR
+    '''
+
+    # NaT / NaN mark candles without a linked trend (or a null trend_ratio).
+    columns = [('id', 'int64'),
+               ('period_start', 'datetime64[ns]'),
+               ('period_open', 'float64'),
+               ('period_high', 'float64'),
+               ('period_low', 'float64'),
+               ('period_close', 'float64'),
+               ('period_volume', 'float64'),
+               ('search_trend', 'datetime64[D]'),
+               ('trend_ratio', 'float64'),
+               ]
+    # model fields read to fill each column
+    column_fields = ['id', 'period_start', 'period_open', 'period_high', 'period_low', 'period_close', 'period_volume', 'search_trend_id', 'search_trend__trend_ratio']
+
+    # threads of this process, other processes are kept out by the lock file of each store (see locked)
+    lock = threading.Lock()
+
+    def __init__(self,
+                 currency,
+                 currency_quoted="USD",
+                 period_interval="1d",
+                 source="nomics",
+                 directory=None
+                 ):
+
+        self.currency = currency
+        self.currency_quoted = currency_quoted
+        self.period_interval = period_interval
+        self.source = source
+        self.directory = directory if directory is not None else settings.CANDLE_STORE_DIR
+        self.path = os.path.join(self.directory, f"{currency}_{currency_quoted}_{period_interval}_{source}")
+
+    def candle_subset(self):
+        return CryptoCandle.objects.filter(crypto_traded=self.currency,
+                                           currency_quoted=self.currency_quoted,
+                                           period_interval=self.period_interval,
+                                           source=self.source
+                                           )
+
+    def column_path(self, column):
+        return os.path.join(self.path, f"{column}.bin")
+
+    def meta(self):
+        try:
+            with open(os.path.join(self.path, 'meta.json')) as meta_file:
+                return json.load(meta_file)
+        except (OSError, ValueError):
+            return None
+
+    def write_meta(self, rows):
+        # Written last and replaced atomically so readers never see a row count bigger than the data.
+        handle, temp_path = tempfile.mkstemp(dir=self.path)
+        with os.fdopen(handle, 'w') as meta_file:
+            json.dump({'rows': rows, 'columns': dict(self.columns)}, meta_file)
+        os.replace(temp_path, os.path.join(self.path, 'meta.json'))
+
+    @contextlib.contextmanager
+    def locked(self):
+        '''
+            Holds the store for writing. Recompute workers and web requests refresh the same files from different processes, so besides the thread lock an exclusive flock is taken on <store>.lock.
+        '''
+        os.makedirs(self.directory, exist_ok=True)
+        with self.lock, open(f"{self.path}.lock", 'a') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def refresh(self, since=None):
+        '''
+            Rewrites the store from the first stored candle at or after since (datetime) with the current database rows. since=None only re-reads the last stored candle and appends newer ones, a store that does not exist yet is built in full.
+
+            Return value:
+            Number of rows written.
+        '''
+        with self.locked():
+            meta = self.meta()
+            stored_rows = meta['rows'] if meta else 0
+            timestamps = self.read('period_start', stored_rows)
+
+            if since is None:
+                position = max(stored_rows - 1, 0)
+            else:
+                position = int(np.searchsorted(timestamps, np.datetime64(self.to_naive(since), 'ns')))
+            candles = self.candle_subset().order_by('period_start')
+            if position:
+                first = timestamps[position] if position < stored_rows else self.to_naive(since)
+                candles = candles.filter(period_start__gte=pd.Timestamp(first).tz_localize('UTC').to_pydatetime())
+
+            new_columns = self.to_columns(list(candles.values_list(*self.column_fields)))
+
+            os.makedirs(self.path, exist_ok=True)
+            for column, dtype in self.columns:
+                mode = 'r+b' if os.path.exists(self.column_path(column)) else 'wb'
+                with open(self.column_path(column), mode) as column_file:
+                    column_file.seek(position * np.dtype(dtype).itemsize)
+                    # never truncate: readers may still map the old size, rows past meta.json are ignored.
+                    column_file.write(new_columns[column].tobytes())
+            self.write_meta(position + len(new_columns['id']))
+
+        return len(new_columns['id'])
+
+    def rebuild(self):
+        '''
+            Rewrites every row (ie. after trend ratios change).
+        '''
+        return self.refresh(since=pd.Timestamp.min)
+
+    def to_columns(self, rows):
+        # rows are tuples in column_fields order
+        values = list(zip(*rows)) if rows else [[] for _ in self.columns]
+        new_columns = {}
+        for (column, dtype), column_values in zip(self.columns, values):
+            if column == 'period_start':
+                column_values = [self.to_naive(value) for value in column_values]
+            elif dtype == 'float64':
+                column_values = [np.nan if value is None else float(value) for value in column_values]
+            new_columns[column] = np.array(column_values, dtype=dtype)
+        return new_columns
+
+    def to_naive(self, value):
+        # stores keep naive UTC datetimes
+        timestamp = pd.Timestamp(value)
+        if timestamp.tzinfo is not None:
+            timestamp = timestamp.tz_convert('UTC').tz_localize(None)
+        return timestamp.to_datetime64()
+
+    def read(self, column, rows):
+        dtype = dict(self.columns)[column]
+        if not rows:
+            return np.empty(0, dtype=dtype)
+        return np.memmap(self.column_path(column), dtype=dtype, mode='r', shape=(rows,))
+
+    def arrays(self):
+        '''
+            Returns dictionary of column: read-only memory-mapped array (no copy). The store is built first if it does not exist yet.
+        '''
+        meta = self.meta()
+        if meta is None:
+            self.refresh()
+            meta = self.meta()
+        return {column: self.read(column, meta['rows']) for column, _ in self.columns}
+
+    def frame(self):
+        '''
+            Returns the store as a pandas DataFrame (one column per array, period_start in naive UTC).
+        '''
+        return pd.DataFrame(self.arrays(), copy=False)
+
+    def candles(self, with_trend=False, reverse=False):
+        '''
+            Returns unsaved CryptoCandle instances with the fields used by Signal (id, period_start, period_date, period_close and search_trend with its trend_ratio), built from the store without querying the database.
+            Prices are rebuilt the way the SQLite backend reads them (15 significant digits, then the field's decimal places) so comparisons give the same result as model instances.
+        '''
+        arrays = self.arrays()
+        close_decimal = self.decimal_reader(CryptoCandle, 'period_close')
+        ratio_decimal = self.decimal_reader(PyTrends, 'trend_ratio')
+
+        rows = range(len(arrays['id']))
+        if with_trend:
+            rows = np.flatnonzero(~np.isnat(arrays['search_trend']))
+        if reverse:
+            rows = rows[::-1]
+
+        candles = []
+        for row in rows:
+            period_start = pd.Timestamp(arrays['period_start'][row]).tz_localize('UTC').to_pydatetime()
+            candle = CryptoCandle(id=int(arrays['id'][row]),
+                                  crypto_traded=self.currency,
+                                  currency_quoted=self.currency_quoted,
+                                  period_interval=self.period_interval,
+                                  source=self.source,
+                                  period_start=period_start,
+                                  period_date=period_start.date(),
+                                  period_close=close_decimal(arrays['period_close'][row])
+                                  )
+            if not np.isnat(arrays['search_trend'][row]):
+                ratio = arrays['trend_ratio'][row]
+                candle.search_trend = PyTrends(date=arrays['search_trend'][row].astype(object),
+                                               trend_ratio=None if np.isnan(ratio) else ratio_decimal(ratio))
+            candles.append(candle)
+        return candles
+
+    @staticmethod
+    def decimal_reader(model, field):
+        '''
+            Returns a function converting a stored float of the DecimalField into the Decimal a model instance would hold.
+        '''
+        places = decimal.Decimal(1).scaleb(-model._meta.get_field(field).decimal_places)
+        create_decimal = decimal.Context(prec=15).create_decimal_from_float
+        return lambda value: create_decimal(float(value)).quantize(places)
+
+    @classmethod
+    def stores(cls, currency=None, directory=None):
+        '''
+            Returns a CandleStore for every market with stored candles (only the given currency when specified).
+        '''
+        scopes = CryptoCandle.objects.values_list('crypto_traded', 'currency_quoted', 'period_interval', 'source').distinct()
+        if currency:
+            scopes = scopes.filter(crypto_traded=currency)
+        return [cls(*scope, directory=directory) for scope in scopes]
+
+    @classmethod
+    def rebuild_all(cls, currency=None):
+        '''
+            Rebuilds every store (ie. after candles are relinked to trends). Returns number of rows written.
+        '''
+        return sum(store.rebuild() for store in cls.stores(currency))
@@ -0,0 +1,129 @@
+from crypto_track.models import CryptoCandle, PyTrends, source_code
+from crypto_track.candle_store import CandleStore
+from django.db import transaction
+from django.dispatch import Signal
+from django.utils import timezone
+import decimal
+
+# Sent after every write with the writer and the earliest period_start written (see crypto_track/rollup.py).
+candles_written = Signal(providing_args=['writer', 'since'])
+
+
+class CandleWriter():
+    '''
+        Writes CryptoCandle records in bulk for a single scope. Candles that already exist for the same period_start_timestamp are updated in place (so related SignalSimulation and Bank rows survive a reload), every other candle is inserted.
+
+        Attributes (align with CryptoCandle model):
+            Required:
+                currency (str): cryptocurrency being tracked
+                data_source (str): where we got this data
+            Optional:
+                currency_quoted (str): currency used for the prices. Default = USD
+                period_interval (str): Time interval of the candle. Default 1d = 1 day (daily)
+                batch_size (int): maximum number of candles per INSERT statement. Default = 500
+                source (str): source key of the candles. Default = source_code(data_source)
+    '''
+
+    update_fields = ['data_source', 'period_start', 'period_date', 'period_low', 'period_open', 'period_close', 'period_high', 'period_volume', 'search_trend', 'update_timestamp']
+
+    def __init__(self,
+                 currency,
+                 data_source,
+                 currency_quoted="USD",
+                 period_interval="1d",
+                 batch_size=500,
+                 source=None
+                 ):
+
+        self.currency = currency
+        self.data_source = data_source
+        self.source = source or source_code(data_source)
+        self.currency_quoted = currency_quoted
+        self.period_interval = period_interval
+        self.batch_size = batch_size
+
+        # Load every trend date once so we do not need a query per candle to link PyTrends (key is the yyyy-mm-dd prefix of the candle timestamp).
+        self.trend_map = {str(trend_date): trend_date for trend_date in PyTrends.objects.values_list('date', flat=True)}
+
+    def build_candle(self, record):
+        '''
+            Creates an unsaved CryptoCandle from a record with timestamp, open, high, low, close and volume keys (as returned by Nomics).
+        '''
+        candle = CryptoCandle(crypto_traded=self.currency,
+                              currency_quoted=self.currency_quoted,
+                              period_interval=self.period_interval,
+                              period_start_timestamp=record['timestamp'],
+                              search_trend_id=self.trend_map.get(record['timestamp'][:10]),
+                              period_low=self.to_decimal(record['low']),
+                              period_open=self.to_decimal(record['open']),
+                              period_close=self.to_decimal(record['close']),
+                              period_high=self.to_decimal(record['high']),
+                              period_volume=self.to_decimal(record['volume']),
+                              data_source=self.data_source,
+                              source=self.source,
+                              update_timestamp=timezone.now()
+                              )
+        candle.set_period_start()
+        return candle
+
+    def to_decimal(self, value):
+        # going through str keeps the exact value sent by the source (floats would otherwise carry their binary representation error).
+        return decimal.Decimal(str(value))
+
+    def write(self, candles):
+        '''
+            Inserts or updates the given candles within one transaction.
+
+            Return value:
+            Tuple of (inserted, updated) record counts.
+        '''
+        existing = self.existing_ids([candle.period_start_timestamp for candle in candles])
+        new_candles = []
+        old_candles = []
+        for candle in candles:
+            candle.pk = existing.get(candle.period_start_timestamp)
+            if candle.pk is None:
+                new_candles.append(candle)
+            else:
+                old_candles.append(candle)
+
+        with transaction.atomic():
+            CryptoCandle.objects.bulk_create(new_candles, batch_size=self.batch_size)
+            self.update_existing(old_candles)
+
+        if candles:
+            since = min(candle.period_start for candle in candles)
+            self.store().refresh(since=since)
+            candles_written.send(sender=self.__class__, writer=self, since=since)
+
+        return len(new_candles), len(old_candles)
+
+    def store(self):
+        return CandleStore(currency=self.currency,
+                           currency_quoted=self.currency_quoted,
+                           period_interval=self.period_interval,
+                           source=self.source
+                           )
+
+    def existing_ids(self, timestamps):
+        '''
+            Returns dictionary of period_start_timestamp: id for candles already stored in this scope.
+        '''
+        scope = CryptoCandle.objects.filter(crypto_traded=self.currency,
+                                            currency_quoted=self.currency_quoted,
+                                            period_interval=self.period_interval,
+                                            source=self.source
+                                            )
+        existing = {}
+        for i in range(0, len(timestamps), self.batch_size):
+            batch = timestamps[i:i + self.batch_size]
+            existing.update(scope.filter(period_start_timestamp__in=batch).values_list('period_start_timestamp', 'id'))
+        return existing
+
+    def update_existing(self, candles):
+        '''
+            Updates candles that already have a primary key. Must run inside the caller's transaction: on SQLite a plain UPDATE per row is cheaper than a CASE per batch once the commit is shared.
+        '''
+        fields = [CryptoCandle._meta.get_field(name) for name in self.update_fields]
+        for candle in candles:
+            CryptoCandle.objects.filter(pk=candle.pk).update(**{field.attname: getattr(candle, field.attname) for field in fields})
@@ -1,11 +1,16 @@
 import os
-from crypto_track.models import CryptoCandle, PyTrends
+from crypto_track.models import CryptoCandle, LatestSignal, PyTrends, SignalLookup, SignalVersion, source_code
+from crypto_track.candle_writer import CandleWriter
+from crypto_track.candle_store import CandleStore
+from crypto_track.json_stream import iter_json_array
+from crypto_track.response_cache import response_cache
 import requests
 import json
+import urllib.parse
 from django.http import JsonResponse
+from django.db.models import OuterRef, Subquery
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
-import datetime
 
 
 class CryptoData():
@@ -16,38 +21,60 @@ class CryptoData():
             Optional:
                 currency_quoted (str): currency used for the prices. Default = USD
                 period_interval (str): Time interval of the candle. Default 1d = 1 day (daily)
+                options (dict): request params (mode, stream, start, end) to use when there is no request, ie. from a management command.
+                session (requests.Session): shared session so connections are pooled between calls. Default = plain requests.
     '''
 
+    nomics_url = "https://api.nomics.com/v1/candles"
+    # number of candles written per transaction when streaming.
+    stream_chunk_size = 1000
+
     def __init__(self,
                  currency,
                  request=None,
                  currency_quoted="USD",
-                 period_interval="1d"
+                 period_interval="1d",
+                 options=None,
+                 session=None
                  ):
 
         self.request = request
         self.currency = currency
         self.currency_quoted = currency_quoted
         self.period_interval = period_interval
+        self.options = request.GET if request is not None else (options or {})
+        self.http = session or requests
 
     def get_nomics(self):
         # example request: GET localhost:8000/load/nomics?currency=BTC
-        api_key = os.environ["NOMICS_API_KEY"]
-        candle_url = "https://api.nomics.com/v1/candles"
-        source = f"Nomics {candle_url}"
+        # optional: mode=bulk writes all candles in batches within one transaction instead of one record at a time.
+        # optional: mode=incremental is the same as bulk but, when no start date is given, only requests candles from the latest one we have stored.
+        # optional: stream=true parses the response while it downloads and writes it in chunks (always uses the bulk writer).
+        mode = self.options.get('mode', '')
+        stream = self.options.get('stream', '').lower() in ('1', 'true')
+        final_url, source = self.build_nomics_url()
 
-        api_url = f"{candle_url}?key={api_key}&interval={self.period_interval}&currency={self.currency}"
+        if stream:
+            return self.load_stream(final_url, source)
 
-        # Get start and end dates if provided
-        final_url = self.append_optional_params("start", api_url)
-        final_url = self.append_optional_params("end", final_url)
+        # Read API (or the response cache)
+        try:
+            historical_crypto_results = self.fetch_nomics(final_url)
+        except Exception as exc:
+            return JsonResponse({"status_code": 409,
+                                 "status": "Conflict",
+                                 "type": type(exc).__name__,
+                                 "message": exc.__str__()})
 
-        # Read API
-        historical_crypto_results = requests.get(final_url).json()
+        if mode in ('bulk', 'incremental'):
+            return self.load_bulk(historical_crypto_results, source)
 
         CryptoCandle.objects.filter(crypto_traded=self.currency,
                                     currency_quoted=self.currency_quoted,
                                     period_interval=self.period_interval).delete()
+        # the signals of the deleted candles are gone too (even if a record below fails)
+        SignalLookup.invalidate(self.currency, self.currency_quoted, self.period_interval)
+        LatestSignal.invalidate(self.currency, self.currency_quoted, self.period_interval)
         x = 0
         for record in historical_crypto_results:
             try:
@@ -74,28 +101,178 @@ class CryptoData():
                 db_record.save()
                 self.append_trend_dates(db_record)
                 x += 1
+        CandleStore.rebuild_all(self.currency)
+        SignalVersion.bump(self.currency)
         return JsonResponse({"status_code": 202, "status": "Accepted",
                              "message": f"Inserted {x} records on {timezone.now()}."}
                             )
 
+    def build_nomics_url(self):
+        '''
+            Returns tuple of (url, data_source) for the Nomics candle request, including the optional start/end params (and the stored watermark when mode=incremental).
+        '''
+        api_key = os.environ["NOMICS_API_KEY"]
+        candle_url = self.nomics_url
+        source = f"Nomics {candle_url}"
+
+        api_url = f"{candle_url}?key={api_key}&interval={self.period_interval}&currency={self.currency}"
+
+        # Get start and end dates if provided
+        final_url = self.append_optional_params("start", api_url)
+        if self.options.get('mode', '') == 'incremental' and final_url == api_url:
+            final_url = self.append_watermark(final_url, source)
+        final_url = self.append_optional_params("end", final_url)
+
+        return final_url, source
+
+    def fetch_nomics(self, url, rate_limiter=None):
+        '''
+            Returns the records of a Nomics request, from the response cache when we already have it.
+            Requests with an end date before today are cached for good, anything else expires after settings.RESPONSE_CACHE_TTL.
+        '''
+        endpoint, _, query = url.partition('?')
+        # the api key is not part of the cache key
+        params = {name: value for name, value in urllib.parse.parse_qsl(query) if name != 'key'}
+
+        records = response_cache.get('nomics', endpoint, params)
+        if records is None:
+            if rate_limiter:
+                rate_limiter.wait()
+            response = self.http.get(url)
+            response.raise_for_status()
+            records = response.json()
+            if isinstance(records, list):
+                response_cache.set('nomics', endpoint, params, records,
+                                   expires=response_cache.includes_today(params.get('end')))
+
+        return records
+
+    def load_bulk(self, records, source):
+        '''
+            Builds every candle in memory and writes them with CandleWriter (batched insert/update in a single transaction).
+        '''
+        try:
+            inserted, updated = self.write_bulk(records, source)
+        except Exception as exc:
+            return JsonResponse({"status_code": 409,
+                                 "status": "Conflict",
+                                 "type": type(exc).__name__,
+                                 "message": exc.__str__()})
+
+        return JsonResponse({"status_code": 202, "status": "Accepted",
+                             "message": f"Inserted {inserted} and updated {updated} records on {timezone.now()}."}
+                            )
+
+    def write_bulk(self, records, source):
+        '''
+            Writes the given Nomics records and returns tuple of (inserted, updated) counts.
+        '''
+        writer = CandleWriter(currency=self.currency,
+                              data_source=source,
+                              currency_quoted=self.currency_quoted,
+                              period_interval=self.period_interval
+                              )
+        candles = [writer.build_candle(record) for record in records]
+
+        return writer.write(candles)
+
+    def load_stream(self, url, source):
+        '''
+            Reads the API response incrementally and writes every stream_chunk_size candles with CandleWriter, so memory use does not grow with the length of the history requested.
+        '''
+        writer = CandleWriter(currency=self.currency,
+                              data_source=source,
+                              currency_quoted=self.currency_quoted,
+                              period_interval=self.period_interval
+                              )
+        inserted = 0
+        updated = 0
+        try:
+            with self.http.get(url, stream=True) as response:
+                response.raise_for_status()
+                candles = []
+                for record in iter_json_array(response.iter_content(chunk_size=64 * 1024)):
+                    candles.append(writer.build_candle(record))
+                    if len(candles) >= self.stream_chunk_size:
+                        chunk_inserted, chunk_updated = writer.write(candles)
+                        inserted += chunk_inserted
+                        updated += chunk_updated
+                        candles = []
+                chunk_inserted, chunk_updated = writer.write(candles)
+                inserted += chunk_inserted
+                updated += chunk_updated
+        except Exception as exc:
+            return JsonResponse({"status_code": 409,
+                                 "status": "Conflict",
+                                 "type": type(exc).__name__,
+                                 "message": f"{exc.__str__()} (inserted {inserted} and updated {updated} records before the error)"})
+
+        return JsonResponse({"status_code": 202, "status": "Accepted",
+                             "message": f"Inserted {inserted} and updated {updated} records on {timezone.now()}."}
+                            )
+
     def append_optional_params(self, var_name, url_og):
         '''
             Checks if request is using an optional parameter and appends it to request of the source.
         '''
-        var_value = self.request.GET.get(var_name, '')
+        var_value = self.options.get(var_name, '')
 
         if var_value:
             url_og += f"&{var_name}={var_value}"
 
         return url_og
 
+    def append_watermark(self, url_og, source):
+        '''
+            Appends the latest stored candle timestamp as the start param. The latest candle is requested again on purpose so a partial period gets replaced with its final values.
+        '''
+        watermark = self.get_watermark(source)
+
+        if watermark:
+            url_og += f"&start={urllib.parse.quote(watermark)}"
+
+        return url_og
+
+    def get_watermark(self, source):
+        '''
+            Returns the latest period_start_timestamp stored for this currency and source (None when there is no history yet).
+        '''
+        latest = CryptoCandle.objects.filter(crypto_traded=self.currency,
+                                             currency_quoted=self.currency_quoted,
+                                             period_interval=self.period_interval,
+                                             source=source_code(source)
+                                             ).order_by('-period_start').values_list('period_start_timestamp', flat=True)[:1]
+
+        return latest[0] if latest else None
+
+    def link_trends(self):
+        '''
+            Updates search_trend of every candle of this currency (all quotes and intervals, or every candle when currency is blank) with a single UPDATE, matching the candle date to PyTrends.date.
+
+            Return value:
+            Number of candles linked to a trend.
+        '''
+        candles = CryptoCandle.objects.all()
+        if self.currency:
+            candles = candles.filter(crypto_traded=self.currency)
+
+        trend = PyTrends.objects.filter(date=OuterRef('period_date')).values('date')[:1]
+        candles.update(search_trend=Subquery(trend))
+        CandleStore.rebuild_all(self.currency or None)
+        for currency in candles.values_list('crypto_traded', flat=True).distinct():
+            SignalVersion.bump(currency)
+        # trend ratios of any date may have changed
+        SignalLookup.invalidate(self.currency or None)
+        LatestSignal.invalidate(self.currency or None)
+
+        return candles.filter(search_trend__isnull=False).count()
+
     def append_trend_dates(self, candle):
         '''
             Appends foreign key of PyTrends unto Candle instance.
         '''
-        date_converted = datetime.datetime.strptime(candle.period_start_timestamp[:10], '%Y-%m-%d')
         try:
-            my_trend = get_object_or_404(PyTrends, pk=date_converted)
+            my_trend = get_object_or_404(PyTrends, pk=candle.period_date)
         except:
             return False
         else:
@@ -1,6 +1,8 @@
 import pandas as pd
 from crypto_track.models import PyTrends, CryptoCandle, SignalSimulation, Simulation, Bank, CryptoProphet
+from crypto_track.candle_store import CandleStore
 from django.apps import apps
+import os
 
 
 class DataExport():
@@ -43,6 +45,16 @@ class DataExport():
         df.to_csv(file_name, quoting=3)
         return f"Successfully saved file {file_name}."
 
+    def export_store(self, store):
+        '''
+            Exports the candle series of one market from its columnar store (no ORM).
+        '''
+        file_name = f"crypto_track_candles_{os.path.basename(store.path)}.{self.format}"
+        df = store.frame()
+        df.set_index('id', inplace=True)
+        df.to_csv(file_name, quoting=3)
+        return f"Successfully saved file {file_name}."
+
     def export_all(self):
         # Initialize our return variable
         return_message = ""
@@ -51,4 +63,8 @@ class DataExport():
             if self.format == 'csv':
                 return_message = return_message + ' ' + self.export_csv(m)
 
+        if self.format == 'csv':
+            for store in CandleStore.stores():
+                return_message = return_message + ' ' + self.export_store(store)
+
         return return_message
@@ -0,0 +1,137 @@
+from django.conf import settings
+from django.db import connections
+from functools import wraps
+import json
+import os
+import sqlite3
+import tempfile
+import threading
+
+REPLICA = 'replica'
+
+# set while a read-only view (read_replica) or a write view (publishes_snapshot) runs in this thread
+state = threading.local()
+
+
+class ReplicaRouter():
+    '''
+        Sends reads of read-only views (see read_replica) to the replica database, every other read and all writes go to default.
+        Reads fall back to default while no snapshot has been published yet.
+    '''
+
+    def db_for_read(self, model, **hints):
+        if getattr(state, 'read_replica', False) and replica_available():
+            return REPLICA
+        return 'default'
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # both databases hold the same schema, the replica is only a copy.
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # the replica gets its tables from the published snapshot.
+        return db == 'default'
+
+
+def replica_available():
+    return REPLICA in settings.DATABASES and os.path.exists(settings.DATABASES[REPLICA]['NAME'])
+
+
+def read_replica(view):
+    '''
+        Decorator for views that only read: their queries are served from the replica snapshot so long writes on default do not block them.
+    '''
+    @wraps(view)
+    def wrapped_view(*args, **kwargs):
+        previous = getattr(state, 'read_replica', False)
+        state.read_replica = True
+        try:
+            return view(*args, **kwargs)
+        finally:
+            state.read_replica = previous
+    return wrapped_view
+
+
+def replica_iterator(iterable):
+    '''
+        Streamed responses are consumed after their view returns, so each item of a StreamingHttpResponse from a read_replica view is pulled with the flag set again.
+    '''
+    iterator = iter(iterable)
+    while True:
+        previous = getattr(state, 'read_replica', False)
+        state.read_replica = True
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        finally:
+            state.read_replica = previous
+        yield item
+
+
+def publishes_snapshot(view):
+    '''
+        Decorator for views that write: the replica snapshot is published once a POST/PATCH request succeeds.
+        Write views call each other (ie. load_trends runs update_candles, which runs update_signal), only the outermost one publishes.
+    '''
+    @wraps(view)
+    def wrapped_view(request, *args, **kwargs):
+        if getattr(state, 'publishing', False):
+            return view(request, *args, **kwargs)
+        state.publishing = True
+        try:
+            response = view(request, *args, **kwargs)
+        finally:
+            state.publishing = False
+        if request.method in ("POST", "PATCH") and succeeded(response):
+            publish_snapshot()
+        return response
+    return wrapped_view
+
+
+def succeeded(response):
+    # write views answer 200 with the outcome in the status_code of the JSON body
+    if response.status_code >= 400:
+        return False
+    try:
+        body = json.loads(response.content)
+    except (AttributeError, ValueError):
+        return True
+    return not isinstance(body, dict) or int(body.get('status_code', 200)) < 400
+
+
+def publish_snapshot():
+    '''
+        Copies the default SQLite database into the replica with the online backup API, then swaps the file in atomically. Connections already open on the replica keep reading the previous snapshot until they close.
+
+        Return value:
+        Path of the published snapshot, or None when no SQLite replica is configured (or default is an in-memory database).
+    '''
+    if REPLICA not in settings.DATABASES:
+        return None
+    source_path = settings.DATABASES['default']['NAME']
+    replica_path = settings.DATABASES[REPLICA]['NAME']
+    if 'sqlite3' not in settings.DATABASES[REPLICA]['ENGINE']:
+        return None
+    if str(source_path) == ':memory:' or 'mode=memory' in str(source_path):
+        # test databases live in memory, there is no file to copy.
+        return None
+
+    handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(replica_path)), suffix='.sqlite3')
+    os.close(handle)
+    source = sqlite3.connect(source_path)
+    target = sqlite3.connect(temp_path)
+    try:
+        # backup only sees committed data, so a snapshot never holds half of a pipeline's transaction.
+        source.backup(target)
+    finally:
+        target.close()
+        source.close()
+    os.replace(temp_path, replica_path)
+
+    # this thread's replica connection still points at the old file.
+    connections[REPLICA].close()
+    return replica_path
@@ -0,0 +1,151 @@
+from django.core import exceptions
+from django.db import models
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django import forms
+import decimal
+
+# how the SQLite backend reads numeric columns stored as REAL (DecimalField, ie. CryptoCandle prices)
+real_context = decimal.Context(prec=15)
+
+
+def to_decimal(value):
+    '''
+        Returns the exact Decimal of a stored value: text written by to_text, a Decimal already read by the backend or a number (REAL values are read with 15 significant digits, the same as DecimalField on SQLite).
+    '''
+    if value is None or isinstance(value, decimal.Decimal):
+        return value
+    if isinstance(value, float):
+        return real_context.create_decimal_from_float(value)
+    return decimal.Decimal(value)
+
+
+def to_text(value):
+    '''
+        Returns the text stored for a value on SQLite: every digit of the Decimal, the same string str() gives.
+    '''
+    if value is None:
+        return None
+    return str(to_decimal(value))
+
+
+class ExactDecimalField(models.Field):
+    '''
+        Decimal column that keeps every digit of the Decimal saved. SQLite has no exact numeric type (DecimalField columns end up as REAL, 15 significant digits), so the value is stored there as text. Other backends use numeric(38, 18).
+        Text does not compare or add as a number in SQL: use ExactAdd, ExactMul, ExactMax and ExactMin instead of operators and Max/Min, they run on the exact values (exact_* functions registered on every SQLite connection).
+    '''
+
+    description = "Decimal number stored without rounding"
+    max_digits = 38
+    decimal_places = 18
+
+    def get_internal_type(self):
+        # keeps the SQLite backend from converting values as REAL
+        return 'TextField'
+
+    def db_type(self, connection):
+        if connection.vendor == 'sqlite':
+            return 'text'
+        return connection.data_types['DecimalField'] % {'max_digits': self.max_digits, 'decimal_places': self.decimal_places}
+
+    def from_db_value(self, value, expression, connection):
+        return to_decimal(value)
+
+    def to_python(self, value):
+        try:
+            return to_decimal(value)
+        except (decimal.InvalidOperation, TypeError, ValueError):
+            raise exceptions.ValidationError(f"'{value}' value must be a decimal number.", code='invalid')
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        return self.to_python(value)
+
+    def get_db_prep_value(self, value, connection, prepared=False):
+        if not prepared:
+            value = self.get_prep_value(value)
+        if value is None:
+            return None
+        if connection.vendor == 'sqlite':
+            return to_text(value)
+        return connection.ops.adapt_decimalfield_value(value, self.max_digits, self.decimal_places)
+
+    def formfield(self, **kwargs):
+        return super().formfield(**{'form_class': forms.DecimalField, **kwargs})
+
+
+class ExactAdd(models.Func):
+    '''
+        Sum of the expressions (a + b), exact on SQLite.
+    '''
+    arg_joiner = ' + '
+    template = '(%(expressions)s)'
+    output_field = ExactDecimalField()
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='exact_add', template='%(function)s(%(expressions)s)', arg_joiner=', ', **extra_context)
+
+
+class ExactMul(ExactAdd):
+    '''
+        Product of the expressions (a * b), exact on SQLite.
+    '''
+    arg_joiner = ' * '
+
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return self.as_sql(compiler, connection, function='exact_mul', template='%(function)s(%(expressions)s)', arg_joiner=', ', **extra_context)
+
+
+class ExactMax(models.Max):
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='exact_max', **extra_context)
+
+
+class ExactMin(models.Min):
+    def as_sqlite(self, compiler, connection, **extra_context):
+        return super().as_sql(compiler, connection, function='exact_min', **extra_context)
+
+
+def exact_add(*values):
+    if any(value is None for value in values):
+        return None
+    return to_text(sum(to_decimal(value) for value in values))
+
+
+def exact_mul(*values):
+    if any(value is None for value in values):
+        return None
+    product = decimal.Decimal(1)
+    for value in values:
+        product *= to_decimal(value)
+    return to_text(product)
+
+
+class ExactExtreme():
+    # SQLite aggregate keeping the largest (or smallest) value compared as Decimal
+    sign = 1
+
+    def __init__(self):
+        self.best = None
+
+    def step(self, value):
+        if value is not None:
+            value = to_decimal(value)
+            if self.best is None or (value - self.best) * self.sign > 0:
+                self.best = value
+
+    def finalize(self):
+        return to_text(self.best)
+
+
+class ExactMinimum(ExactExtreme):
+    sign = -1
+
+
+@receiver(connection_created)
+def register_exact_functions(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function('exact_add', -1, exact_add)
+        connection.connection.create_function('exact_mul', -1, exact_mul)
+        connection.connection.create_aggregate('exact_max', 1, ExactExtreme)
+        connection.connection.create_aggregate('exact_min', 1, ExactMinimum)
@@ -0,0 +1,201 @@
+from crypto_track.models import CryptoCandle
+from crypto_track.candle_writer import CandleWriter
+from crypto_track.crypto_data import CryptoData
+from crypto_track.track_exception import TrackException
+import ccxt.async_support as ccxt_async
+import asyncio
+import datetime
+import itertools
+import time
+
+
+class CandleJob():
+    '''
+        One (exchange, market, interval) combination to load.
+
+        Attributes:
+            exchange_id (str): ccxt exchange id, ie. kraken
+            market (str): ccxt unified symbol, ie. BTC/USD
+            period_interval (str): ccxt timeframe, ie. 1d
+    '''
+
+    def __init__(self, exchange_id, market, period_interval):
+        self.exchange_id = exchange_id
+        self.market = market
+        self.period_interval = period_interval
+        self.currency, _, self.currency_quoted = market.partition('/')
+        self.data_source = f"{ExchangeLoader.source_prefix} {exchange_id}"
+        self.since = None
+        self.rows = []
+        self.error = None
+
+    def __str__(self):
+        return f"{self.exchange_id}:{self.market}:{self.period_interval}"
+
+
+def build_jobs(exchange_ids, markets, intervals):
+    '''
+        Returns a CandleJob for every combination of the given exchanges, markets and intervals.
+    '''
+    return [CandleJob(exchange_id, market, interval)
+            for exchange_id, market, interval in itertools.product(exchange_ids, markets, intervals)]
+
+
+class ExchangeLoader():
+    '''
+        Loads OHLCV candles from any exchange supported by ccxt. All (exchange, market, interval) jobs are fetched concurrently with asyncio, paginating from the latest stored candle (or since) up to now, then written with the same CandleWriter as Nomics.
+
+        Attributes:
+            Required:
+                jobs (list of CandleJob): what to load
+            Optional:
+                since (str): first timestamp (RFC3339) to request when there is no stored history. Default = 2013-01-01
+                page_limit (int): candles requested per call. Default = 500
+                max_concurrency (int): maximum number of requests in flight over all exchanges. Default = 10
+                exchange_config (dict): extra ccxt settings per exchange id, ie. {'kraken': {'urls': {...}}} to point at a local server.
+    '''
+
+    source_prefix = "CCXT"
+
+    def __init__(self,
+                 jobs,
+                 since="2013-01-01T00:00:00Z",
+                 page_limit=500,
+                 max_concurrency=10,
+                 exchange_config=None
+                 ):
+
+        self.jobs = jobs
+        self.since = since
+        self.page_limit = page_limit
+        self.max_concurrency = max_concurrency
+        self.exchange_config = exchange_config or {}
+
+    def load(self):
+        '''
+            Fetches all jobs and writes them.
+
+            Return value:
+            Dictionary with a result per job plus total candles, seconds and candles_per_second for the fetch and the write.
+        '''
+        for job in self.jobs:
+            self.prepare(job)
+
+        started = time.monotonic()
+        loop = asyncio.new_event_loop()
+        try:
+            loop.run_until_complete(self.fetch_all())
+        finally:
+            loop.close()
+        fetch_seconds = time.monotonic() - started
+
+        results = {}
+        written = 0
+        started = time.monotonic()
+        for job in self.jobs:
+            if job.error is None:
+                try:
+                    inserted, updated = self.write(job)
+                except Exception as exc:
+                    job.error = exc
+                else:
+                    written += inserted + updated
+                    results[str(job)] = {"status": "Accepted", "inserted": inserted, "updated": updated}
+            if job.error is not None:
+                results[str(job)] = {"status": "Conflict",
+                                     "type": type(job.error).__name__,
+                                     "message": job.error.__str__()}
+        write_seconds = time.monotonic() - started
+
+        fetched = sum(len(job.rows) for job in self.jobs)
+        return {"results": results,
+                "fetched": fetched,
+                "fetch_seconds": round(fetch_seconds, 3),
+                "fetch_candles_per_second": round(fetched / fetch_seconds, 1) if fetch_seconds else None,
+                "written": written,
+                "write_seconds": round(write_seconds, 3),
+                "write_candles_per_second": round(written / write_seconds, 1) if write_seconds else None,
+                }
+
+    def prepare(self, job):
+        '''
+            Validates the job and finds where to start (latest stored candle for this exchange, or self.since).
+        '''
+        if job.exchange_id not in ccxt_async.exchanges:
+            job.error = TrackException(f"{job.exchange_id} is not an exchange supported by ccxt.", "Bad Request")
+            return
+        for field_name, value in (('crypto_traded', job.currency), ('currency_quoted', job.currency_quoted)):
+            max_length = CryptoCandle._meta.get_field(field_name).max_length
+            if not value or len(value) > max_length:
+                job.error = TrackException(f"Market {job.market} does not fit CryptoCandle.{field_name} (max {max_length} characters).", "Bad Request")
+                return
+
+        my_data = CryptoData(currency=job.currency,
+                             currency_quoted=job.currency_quoted,
+                             period_interval=job.period_interval
+                             )
+        job.since = self.to_milliseconds(my_data.get_watermark(job.data_source) or self.since)
+
+    async def fetch_all(self):
+        # one client per exchange so ccxt's rate limiter is shared by every job on that exchange.
+        exchanges = {}
+        for job in self.jobs:
+            if job.error is None and job.exchange_id not in exchanges:
+                config = {'enableRateLimit': True}
+                config.update(self.exchange_config.get(job.exchange_id, {}))
+                exchanges[job.exchange_id] = getattr(ccxt_async, job.exchange_id)(config)
+
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        try:
+            await asyncio.gather(*[self.fetch(exchanges[job.exchange_id], job, semaphore)
+                                   for job in self.jobs if job.error is None])
+        finally:
+            for exchange in exchanges.values():
+                await exchange.close()
+
+    async def fetch(self, exchange, job, semaphore):
+        '''
+            Pages through fetch_ohlcv until we reach the present. Errors are kept on the job so one bad market does not stop the others.
+        '''
+        try:
+            interval_ms = exchange.parse_timeframe(job.period_interval) * 1000
+            since = job.since
+            now = exchange.milliseconds()
+            while since <= now:
+                async with semaphore:
+                    page = await exchange.fetch_ohlcv(job.market, job.period_interval, since=since, limit=self.page_limit)
+                page = [row for row in page if row[0] >= since]
+                if not page:
+                    break
+                job.rows.extend(page)
+                since = page[-1][0] + interval_ms
+        except Exception as exc:
+            job.error = exc
+
+    def write(self, job):
+        writer = CandleWriter(currency=job.currency,
+                              data_source=job.data_source,
+                              currency_quoted=job.currency_quoted,
+                              period_interval=job.period_interval
+                              )
+        candles = [writer.build_candle(self.to_record(row)) for row in job.rows]
+        return writer.write(candles)
+
+    def to_record(self, row):
+        '''
+            Converts a ccxt OHLCV row [timestamp ms, open, high, low, close, volume] to the Nomics record format used by CandleWriter.
+        '''
+        timestamp = datetime.datetime.utcfromtimestamp(row[0] / 1000).strftime('%Y-%m-%dT%H:%M:%SZ')
+        return {'timestamp': timestamp,
+                'open': row[1],
+                'high': row[2],
+                'low': row[3],
+                'close': row[4],
+                'volume': row[5]}
+
+    def to_milliseconds(self, timestamp):
+        # accepts RFC3339 (as stored in period_start_timestamp) or yyyy-mm-dd
+        if len(timestamp) == 10:
+            timestamp += "T00:00:00Z"
+        parsed = datetime.datetime.strptime(timestamp, '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=datetime.timezone.utc)
+        return int(parsed.timestamp() * 1000)
@@ -0,0 +1,73 @@
+import codecs
+import json
+
+whitespace = ' \t\n\r'
+
+
+def iter_json_array(chunks):
+    '''
+        Yields the elements of a top-level JSON array one at a time.
+
+        Attributes:
+            chunks (iterable of bytes): raw UTF-8 body as it arrives (ie. requests Response.iter_content()).
+
+        Only the element currently being parsed and the unparsed tail of the last chunk are kept in memory, so the size of the whole payload does not matter.
+    '''
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder('utf-8')()
+    buffer = ''
+    # open: expecting "[" | first: value or "]" | value: value | separator: "," or "]" | closed: nothing else allowed
+    state = 'open'
+
+    for chunk, final in _with_final_flag(chunks):
+        buffer += utf8.decode(chunk, final=final)
+        pos = 0
+        while True:
+            while pos < len(buffer) and buffer[pos] in whitespace:
+                pos += 1
+            if pos == len(buffer):
+                break
+            char = buffer[pos]
+
+            if state == 'open':
+                if char != '[':
+                    raise ValueError(f"Expected a JSON array but response starts with {buffer[pos:pos + 50]!r}.")
+                state = 'first'
+                pos += 1
+            elif state in ('first', 'separator') and char == ']':
+                state = 'closed'
+                pos += 1
+            elif state == 'separator':
+                if char != ',':
+                    raise ValueError(f"Expected ',' or ']' at {buffer[pos:pos + 50]!r}.")
+                state = 'value'
+                pos += 1
+            elif state in ('first', 'value'):
+                try:
+                    element, end = decoder.raw_decode(buffer, pos)
+                except json.JSONDecodeError:
+                    if final:
+                        raise
+                    # element is not complete yet, wait for the next chunk.
+                    break
+                if not final and (end == len(buffer) or buffer[end] not in whitespace + ',]'):
+                    # a number could still be cut in half (ie. "1" of "1.5"), wait until we see what follows it.
+                    break
+                yield element
+                state = 'separator'
+                pos = end
+            else:
+                raise ValueError(f"Unexpected data after end of JSON array: {buffer[pos:pos + 50]!r}.")
+
+        buffer = buffer[pos:]
+
+    if state != 'closed':
+        raise ValueError("Response ended before the JSON array was closed.")
+
+
+def _with_final_flag(chunks):
+    # Pairs every chunk with False and finishes with an empty chunk flagged True so the decoder can flush.
+    for chunk in chunks:
+        if chunk:
+            yield chunk, False
+    yield b'', True
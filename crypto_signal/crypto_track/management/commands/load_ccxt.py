@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+from crypto_track.db_router import publish_snapshot
+from crypto_track.exchange_loader import ExchangeLoader, build_jobs
+
+
+class Command(BaseCommand):
+    help = 'Loads candles from exchanges supported by ccxt and reports throughput. sample: python manage.py load_ccxt --exchange kraken bitstamp --market BTC/USD --interval 1d'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--exchange', nargs='+', required=True, help='ccxt exchange ids, ie. kraken bitstamp')
+        parser.add_argument('--market', nargs='+', required=True, help='ccxt unified symbols, ie. BTC/USD ETH/USD')
+        parser.add_argument('--interval', nargs='+', default=['1d'], help='ccxt timeframes, ie. 1h 1d')
+        parser.add_argument('--since', default='2013-01-01', help='first date (yyyy-mm-dd) when there is no stored history')
+        parser.add_argument('--page-limit', type=int, default=500, help='candles requested per call')
+        parser.add_argument('--concurrency', type=int, default=10, help='maximum number of requests in flight')
+
+    def handle(self, *args, **options):
+        loader = ExchangeLoader(build_jobs(options['exchange'], options['market'], options['interval']),
+                                since=options['since'],
+                                page_limit=options['page_limit'],
+                                max_concurrency=options['concurrency']
+                                )
+        stats = loader.load()
+
+        for job, result in stats['results'].items():
+            if result['status'] == 'Accepted':
+                self.stdout.write(f"{job}: inserted {result['inserted']} and updated {result['updated']} records.")
+            else:
+                self.stderr.write(f"{job}: {result['type']} {result['message']}")
+        self.stdout.write(f"Fetched {stats['fetched']} candles in {stats['fetch_seconds']}s ({stats['fetch_candles_per_second']} candles/sec).")
+        self.stdout.write(f"Wrote {stats['written']} candles in {stats['write_seconds']}s ({stats['write_candles_per_second']} candles/sec).")
+
+        if publish_snapshot():
+            self.stdout.write("Published replica snapshot.")
@@ -0,0 +1,37 @@
+from django.core.management.base import BaseCommand
+from crypto_track.batch_loader import NomicsBatchLoader
+from crypto_track.response_cache import response_cache
+from crypto_track.db_router import publish_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Loads Nomics candles for several currencies concurrently. sample: python manage.py load_nomics BTC ETH LTC --mode incremental'
+
+    def add_arguments(self, parser):
+        parser.add_argument('currencies', nargs='+', help='cryptocurrencies to load, ie. BTC ETH')
+        parser.add_argument('--mode', default='incremental', choices=['bulk', 'incremental'])
+        parser.add_argument('--start', default='', help='start date (yyyy-mm-dd), overrides the incremental watermark')
+        parser.add_argument('--end', default='', help='end date (yyyy-mm-dd)')
+        parser.add_argument('--interval', default='1d', help='candle interval, ie. 1h (coarser intervals are rolled up from it)')
+        parser.add_argument('--workers', type=int, default=8, help='maximum number of requests in flight')
+        parser.add_argument('--rate', type=float, default=4, help='maximum requests per second shared by all workers')
+
+    def handle(self, *args, **options):
+        loader = NomicsBatchLoader(options['currencies'],
+                                   options={'mode': options['mode'], 'start': options['start'], 'end': options['end'], 'interval': options['interval']},
+                                   max_workers=options['workers'],
+                                   calls_per_second=options['rate']
+                                   )
+        results = loader.load()
+
+        for currency, result in results.items():
+            if result['status'] == 'Accepted':
+                self.stdout.write(f"{currency}: inserted {result['inserted']} and updated {result['updated']} records ({result['seconds']}s).")
+            else:
+                self.stderr.write(f"{currency}: {result['type']} {result['message']}")
+
+        if publish_snapshot():
+            self.stdout.write("Published replica snapshot.")
+
+        stats = response_cache.stats()
+        self.stdout.write(f"Response cache: {stats['hits']} hits, {stats['misses']} misses, {stats['entries']} entries ({stats['bytes']} bytes).")
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+from crypto_track.db_router import publish_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Copies the default database into the replica read by the signal API. sample: python manage.py publish_snapshot'
+
+    def handle(self, *args, **options):
+        replica_path = publish_snapshot()
+        if replica_path:
+            self.stdout.write(f"Published snapshot to {replica_path}.")
+        else:
+            self.stderr.write("No SQLite replica database is configured.")
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand
+from crypto_track.recompute import SignalRecompute
+from crypto_track.db_router import publish_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Recalculates the signals of every simulation and currency in parallel worker processes. sample: python manage.py recompute_signals --currency BTC ETH --workers 8'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', nargs='*', default=[], help='cryptocurrencies to recompute, ie. BTC ETH (default: all)')
+        parser.add_argument('--simulation', nargs='*', type=int, default=[], help='simulation ids to recompute (default: all)')
+        parser.add_argument('--interval', default='1d', help='candle interval')
+        parser.add_argument('--engine', default='vector', choices=['vector', 'loop'])
+        parser.add_argument('--mode', default='full', choices=['full', 'incremental'])
+        parser.add_argument('--days', type=int, default=90, help='prediction days of simulations 4 and 5')
+        parser.add_argument('--workers', type=int, default=None, help='number of worker processes (default: number of CPUs)')
+
+    def handle(self, *args, **options):
+        recompute = SignalRecompute(currencies=options['currency'],
+                                    simulation_ids=options['simulation'],
+                                    options={'interval': options['interval'], 'engine': options['engine'],
+                                             'mode': options['mode'], 'days': options['days']},
+                                    max_workers=options['workers']
+                                    )
+        summary = recompute.run()
+
+        for pair, result in summary['results'].items():
+            if result['status'] == 'Accepted':
+                self.stdout.write(f"{pair}: {result['message']} ({result['seconds']}s)")
+            else:
+                self.stderr.write(f"{pair}: {result['type']} {result['message']} ({result['seconds']}s)")
+        self.stdout.write(f"Recalculated {len(summary['results'])} simulations in {summary['seconds']}s.")
+
+        if publish_snapshot():
+            self.stdout.write("Published replica snapshot.")
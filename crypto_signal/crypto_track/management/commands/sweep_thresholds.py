@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from crypto_track.sweep import ThresholdSweep, parse_grid
+from crypto_track.db_router import publish_snapshot
+
+
+class Command(BaseCommand):
+    help = 'Scores a grid of price/trend thresholds of simulation 1 or 3 in memory. sample: python manage.py sweep_thresholds --currency BTC --simulation 1 --price 0:200:5 --trend 0.2:0.6:0.01'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--currency', default='BTC', help='cryptocurrency to simulate')
+        parser.add_argument('--simulation', type=int, default=1, help='simulation id (1 or 3)')
+        parser.add_argument('--price', required=True, help='price thresholds, comma separated or start:stop:step')
+        parser.add_argument('--trend', required=True, help='trend ratio thresholds, comma separated or start:stop:step')
+        parser.add_argument('--interval', default='1d', help='candle interval')
+        parser.add_argument('--top', type=int, default=10, help='number of combinations to print')
+        parser.add_argument('--save', action='store_true', help='write the signals and bank history of the best combination')
+
+    def handle(self, *args, **options):
+        threshold_sweep = ThresholdSweep(currency=options['currency'],
+                                         simulation_id=options['simulation'],
+                                         price_thresholds=parse_grid(options['price']),
+                                         trend_thresholds=parse_grid(options['trend']),
+                                         period_interval=options['interval']
+                                         )
+        summary = threshold_sweep.run(top=options['top'])
+
+        for result in summary['results']:
+            self.stdout.write(f"price {result['price_threshold']} trend {result['trend_threshold']}: "
+                              f"equity {result['final_equity']:.4f} drawdown {result['max_drawdown']:.2%} trades {result['trades']}")
+        self.stdout.write(f"Scored {summary['combinations']} combinations over {summary['candles']} candles in {summary['seconds']}s.")
+
+        if options['save']:
+            best = summary['results'][0]
+            self.stdout.write(threshold_sweep.save(best['price_threshold'], best['trend_threshold']))
+            if publish_snapshot():
+                self.stdout.write("Published replica snapshot.")
@@ -0,0 +1,46 @@
+# Generated by Django 2.1.7 on 2026-10-18 08:36
+
+import datetime
+from django.db import migrations, models
+from django.utils.dateparse import parse_datetime
+from django.utils.timezone import utc
+
+
+def backfill_period_start(apps, schema_editor):
+    # Parse the RFC3339 string once for every existing candle.
+    CryptoCandle = apps.get_model('crypto_track', 'CryptoCandle')
+    for candle_id, timestamp in list(CryptoCandle.objects.values_list('id', 'period_start_timestamp')):
+        period_start = parse_datetime(timestamp)
+        CryptoCandle.objects.filter(id=candle_id).update(period_start=period_start,
+                                                         period_date=period_start.date() if period_start else None)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_track', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cryptocandle',
+            name='period_date',
+            field=models.DateField(db_index=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='cryptocandle',
+            name='period_start',
+            field=models.DateTimeField(db_index=True, null=True),
+        ),
+        migrations.RunPython(backfill_period_start, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cryptocandle',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 36, 26, 399480, tzinfo=utc)),
+        ),
+        migrations.AlterField(
+            model_name='cryptoprophet',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 36, 26, 401322, tzinfo=utc)),
+        ),
+    ]
@@ -1,25 +0,0 @@
-# Generated by Django 2.1.2 on 2018-10-18 10:08
-
-import datetime
-from django.db import migrations, models
-from django.utils.timezone import utc
-
-
-class Migration(migrations.Migration):
-
-    dependencies = [
-        ('crypto_track', '0002_auto_20181018_1002'),
-    ]
-
-    operations = [
-        migrations.AlterField(
-            model_name='cryptocandle',
-            name='update_timestamp',
-            field=models.DateTimeField(default=datetime.datetime(2018, 10, 18, 10, 8, 52, 965993, tzinfo=utc)),
-        ),
-        migrations.AlterField(
-            model_name='cryptocandlehistory',
-            name='update_timestamp',
-            field=models.DateTimeField(default=datetime.datetime(2018, 10, 18, 10, 8, 52, 966718, tzinfo=utc)),
-        ),
-    ]
@@ -0,0 +1,51 @@
+# Generated by Django 2.1.7 on 2026-10-18 08:38
+
+import datetime
+from django.db import migrations, models
+from django.utils.timezone import utc
+
+
+def backfill_source(apps, schema_editor):
+    # Same rule as crypto_track.models.source_code, copied so this migration does not depend on the current models module.
+    CryptoCandle = apps.get_model('crypto_track', 'CryptoCandle')
+    for data_source in CryptoCandle.objects.values_list('data_source', flat=True).distinct():
+        source = '-'.join(word.lower() for word in data_source.split() if '://' not in word)
+        CryptoCandle.objects.filter(data_source=data_source).update(source=source)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_track', '0002_auto_20261018_1036'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='cryptocandle',
+            name='source',
+            field=models.CharField(default='', max_length=50),
+        ),
+        migrations.RunPython(backfill_source, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='cryptocandle',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 38, 38, 36080, tzinfo=utc)),
+        ),
+        migrations.AlterField(
+            model_name='cryptoprophet',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 38, 38, 38020, tzinfo=utc)),
+        ),
+        migrations.AlterUniqueTogether(
+            name='cryptocandle',
+            unique_together={('crypto_traded', 'currency_quoted', 'period_interval', 'source', 'period_start')},
+        ),
+        migrations.AddIndex(
+            model_name='cryptoprophet',
+            index=models.Index(fields=['simulation', 'crypto_traded', 'date'], name='crypto_trac_simulat_1a5e38_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='signalsimulation',
+            index=models.Index(fields=['simulation', 'crypto_candle'], name='crypto_trac_simulat_a58ff7_idx'),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.7 on 2026-10-18 08:40
+
+import crypto_track.exact_decimal
+import datetime
+from django.db import migrations, models
+from django.utils.timezone import utc
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_track', '0003_auto_20261018_1038'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bank',
+            name='cash_bank',
+            field=crypto_track.exact_decimal.ExactDecimalField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='bank',
+            name='crypto_bank',
+            field=crypto_track.exact_decimal.ExactDecimalField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='cryptocandle',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 40, 32, 448552, tzinfo=utc)),
+        ),
+        migrations.AlterField(
+            model_name='cryptoprophet',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 40, 32, 451100, tzinfo=utc)),
+        ),
+    ]
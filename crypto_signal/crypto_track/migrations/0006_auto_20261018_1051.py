@@ -0,0 +1,39 @@
+# Generated by Django 2.1.7 on 2026-10-18 08:51
+
+import datetime
+from django.db import migrations, models
+from django.utils.timezone import utc
+import django.utils.timezone
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_track', '0005_auto_20261018_1049'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='cryptocandle',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 51, 0, 368867, tzinfo=utc)),
+        ),
+        migrations.AlterField(
+            model_name='cryptoprophet',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 51, 0, 371497, tzinfo=utc)),
+        ),
+        migrations.CreateModel(
+            name='SignalVersion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('simulation_id', models.IntegerField()),
+                ('crypto_traded', models.CharField(max_length=3)),
+                ('version', models.BigIntegerField(default=0)),
+                ('update_timestamp', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('simulation_id', 'crypto_traded')},
+            },
+        ),
+    ]
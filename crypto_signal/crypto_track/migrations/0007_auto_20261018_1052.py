@@ -0,0 +1,46 @@
+# Generated by Django 2.1.7 on 2026-10-18 08:52
+
+import datetime
+from django.db import migrations, models
+from django.utils.timezone import utc
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('crypto_track', '0006_auto_20261018_1051'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LatestSignal',
+            fields=[
+                ('simulation_id', models.IntegerField()),
+                ('simulation_name', models.CharField(max_length=50, null=True)),
+                ('crypto_traded', models.CharField(max_length=3)),
+                ('currency_quoted', models.CharField(max_length=3)),
+                ('period_interval', models.CharField(max_length=3)),
+                ('date', models.DateField()),
+                ('timestamp', models.CharField(max_length=50)),
+                ('period_close', models.DecimalField(decimal_places=10, max_digits=25)),
+                ('comparison_period_date', models.CharField(max_length=10, null=True)),
+                ('comparison_period_close', models.DecimalField(decimal_places=10, max_digits=25, null=True)),
+                ('trend_ratio', models.DecimalField(decimal_places=5, max_digits=10, null=True)),
+                ('signal', models.CharField(max_length=4, null=True)),
+                ('key', models.CharField(max_length=100, primary_key=True, serialize=False)),
+            ],
+            options={
+                'abstract': False,
+            },
+        ),
+        migrations.AlterField(
+            model_name='cryptocandle',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 52, 45, 420760, tzinfo=utc)),
+        ),
+        migrations.AlterField(
+            model_name='cryptoprophet',
+            name='update_timestamp',
+            field=models.DateTimeField(default=datetime.datetime(2026, 10, 18, 8, 52, 45, 424633, tzinfo=utc)),
+        ),
+    ]
@@ -1,6 +1,19 @@
 from django.db import models
 from django.utils import timezone
+from django.utils.dateparse import parse_datetime
 from django.contrib.auth.models import User
+from crypto_track.exact_decimal import ExactDecimalField
+
+
+def source_code(data_source):
+    '''
+        Short key stored in CryptoCandle.source, made of the words of data_source without urls, ie. "Nomics https://api.nomics.com/v1/candles" = nomics, "CCXT kraken" = ccxt-kraken.
+    '''
+    return '-'.join(word.lower() for word in data_source.split() if '://' not in word)
+
+
+# data_source of the candles materialized by crypto_track/rollup.py starts with this, ie. "Rollup 1h Nomics https://api.nomics.com/v1/candles" (their source key stays the one of the base candles)
+ROLLUP_PREFIX = "Rollup "
 
 
 class PyTrends(models.Model):
@@ -32,6 +45,8 @@ class CryptoCandle(models.Model):
         currency_quoted (str): currency used for the prices
         period_interval (str): Time interval of the candle
         period_start_timestamp (str): Start time of the candle in RFC3339
+        period_start (datetime): period_start_timestamp parsed once at write time (indexed, use it for ordering and ranges)
+        period_date (date): date part of period_start (indexed, use it for lookups by day)
         search_trend (PyTrend): PyTrend object related to that day (can be null)
         period_low (dec): Lowest price in currency_quoted
         period_open(dec): First trade price in currency_quoted
@@ -39,6 +54,7 @@ class CryptoCandle(models.Model):
         period_high (dec): Highest price in currency_quoted
         period_volume (dec): Volume transacted in period interval in currency_quoted
         data_source (str): where we got this data
+        source (str): short indexed key of data_source (see source_code), use it to filter by source
         update_timestamp (datetime): when record was created in this database
 
     '''
@@ -46,6 +62,8 @@ class CryptoCandle(models.Model):
     currency_quoted = models.CharField(max_length=3)
     period_interval = models.CharField(max_length=3)
     period_start_timestamp = models.CharField(max_length=50)
+    period_start = models.DateTimeField(null=True, db_index=True)
+    period_date = models.DateField(null=True, db_index=True)
     search_trend = models.ForeignKey(PyTrends,
                                      to_field='date',
                                      on_delete=models.SET_NULL,
@@ -57,11 +75,30 @@ class CryptoCandle(models.Model):
     period_high = models.DecimalField(max_digits=25, decimal_places=10)
     period_volume = models.DecimalField(max_digits=25, decimal_places=10)
     data_source = models.CharField(max_length=255)
+    source = models.CharField(max_length=50, default='')
     update_timestamp = models.DateTimeField(default=timezone.now())
 
+    class Meta:
+        # leading columns match the filters of every candle scan, period_start gives the order.
+        unique_together = ('crypto_traded', 'currency_quoted', 'period_interval', 'source', 'period_start')
+
     def __str__(self):
         return f"{self.crypto_traded} | {self.period_start_timestamp} | {self.data_source} | Period Close: {self.period_close}"
 
+    def save(self, *args, **kwargs):
+        if self.period_start is None:
+            self.set_period_start()
+        if not self.source:
+            self.source = source_code(self.data_source)
+        super().save(*args, **kwargs)
+
+    def set_period_start(self):
+        '''
+            Parses period_start_timestamp into period_start and period_date. Called on save, bulk writes need to call it themselves.
+        '''
+        self.period_start = parse_datetime(self.period_start_timestamp)
+        self.period_date = self.period_start.date() if self.period_start else None
+
 
 class Simulation(models.Model):
     '''
@@ -99,6 +136,9 @@ class SignalSimulation(models.Model):
                                        )
     signal = models.CharField(max_length=4, null=True)
 
+    class Meta:
+        indexes = [models.Index(fields=['simulation', 'crypto_candle'])]
+
     def __str__(self):
         return f"{self.crypto_candle} | {self.simulation} | {self.signal}"
 
@@ -116,9 +156,9 @@ class Bank(models.Model):
     '''
     signal_simulation = models.ForeignKey(SignalSimulation, on_delete=models.CASCADE)
     user = models.ForeignKey(User, on_delete=models.CASCADE)
-    # storing values in CharField because Sqlite stores them as float and we do not want to lose decimal point significance.
-    crypto_bank = models.CharField(max_length=50, default='0.0')
-    cash_bank = models.CharField(max_length=50, default='0.0000')
+    # every digit is kept (text on SQLite, numeric elsewhere), a REAL column would round balances. Hindsight simulations reach 1e15, too wide for a scaled 64-bit integer.
+    crypto_bank = ExactDecimalField(default=0)
+    cash_bank = ExactDecimalField(default=0)
 
     def __str__(self):
         return f"{self.signal_simulation} | {self.user} | Crypto Bank: {self.crypto_bank} | Cash Bank: {self.cash_bank}"
@@ -155,5 +195,170 @@ class CryptoProphet(models.Model):
     change = models.DecimalField(max_digits=25, decimal_places=10, null=True)
     update_timestamp = models.DateTimeField(default=timezone.now())
 
+    class Meta:
+        indexes = [models.Index(fields=['simulation', 'crypto_traded', 'date'])]
+
     def __str__(self):
         return f"{self.object_type} | {self.date} | {self.crypto_traded} | {self.simulation}"
+
+
+class SignalResponse(models.Model):
+    '''
+        Description:
+            Fields of a Signal.get_signal response, shared by the read tables of the signal API.
+
+        Attributes:
+            simulation_id (int): Simulation used (not a ForeignKey so reads never join)
+            simulation_name (str): name of the Simulation, blank when there is no signal for the candle
+            crypto_traded (str): cryptocurrency being tracked
+            currency_quoted (str): currency used for the prices
+            period_interval (str): Time interval of the candle
+            date (date): date of the candle
+            timestamp (str): period_start_timestamp of the candle
+            period_close (dec): close price of the candle
+            comparison_period_date (str): date of the candle compared against
+            comparison_period_close (dec): close price of the candle compared against
+            trend_ratio (dec): PyTrends.trend_ratio of the candle
+            signal (str): BUY/SELL/HOLD
+    '''
+    simulation_id = models.IntegerField()
+    simulation_name = models.CharField(max_length=50, null=True)
+    crypto_traded = models.CharField(max_length=3)
+    currency_quoted = models.CharField(max_length=3)
+    period_interval = models.CharField(max_length=3)
+    date = models.DateField()
+    timestamp = models.CharField(max_length=50)
+    period_close = models.DecimalField(max_digits=25, decimal_places=10)
+    comparison_period_date = models.CharField(max_length=10, null=True)
+    comparison_period_close = models.DecimalField(max_digits=25, decimal_places=10, null=True)
+    trend_ratio = models.DecimalField(max_digits=10, decimal_places=5, null=True)
+    signal = models.CharField(max_length=4, null=True)
+
+    class Meta:
+        abstract = True
+
+    def __str__(self):
+        return f"{self.key} | {self.signal}"
+
+    def message(self):
+        '''
+            Returns the same dictionary as Signal.get_signal.
+        '''
+        return {"currency": self.crypto_traded,
+                "currency_quoted": self.currency_quoted,
+                "date": self.timestamp[:10],
+                "timestamp": self.timestamp,
+                "period_close": self.period_close,
+                "comparison_period_date": self.comparison_period_date,
+                "comparison_period_close": self.comparison_period_close,
+                "trend_ratio": self.trend_ratio,
+                "simulation_name": self.simulation_name,
+                "signal": self.signal,
+                }
+
+    @classmethod
+    def invalidate(cls, crypto_traded=None, currency_quoted=None, period_interval=None, since=None):
+        '''
+            Deletes the rows of every simulation of a market (every currency, quote or interval when None) that may no longer match its candles, only the rows dated or compared from since (datetime) on when given. Signal.get_signal reads the candle and simulation models until update_signal rebuilds them.
+        '''
+        rows = cls.objects.all()
+        if crypto_traded:
+            rows = rows.filter(crypto_traded=crypto_traded)
+        if currency_quoted:
+            rows = rows.filter(currency_quoted=currency_quoted)
+        if period_interval:
+            rows = rows.filter(period_interval=period_interval)
+        if since is not None:
+            # a row also holds the close of its comparison candle, which can be later than its own (ie. hindsight)
+            rows = rows.filter(models.Q(date__gte=since.date()) | models.Q(comparison_period_date__gte=str(since.date())))
+        return rows.delete()[0]
+
+
+class SignalLookup(SignalResponse):
+    '''
+        Description:
+            Read table for the signal API, one row per (simulation, currency, quote, interval, date) holding the whole response of Signal.get_signal so a request is a single primary key lookup. Rebuilt at the end of Signal.update_signal, rows of dates whose candles or trends are written again are deleted until then (see invalidate).
+            For intraday intervals the row holds the last candle of the day.
+
+        Attributes:
+            key (str): "simulation_id:crypto_traded:currency_quoted:period_interval:date" (see make_key)
+            other fields: see SignalResponse
+    '''
+    key = models.CharField(max_length=100, primary_key=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['simulation_id', 'crypto_traded', 'currency_quoted', 'period_interval', 'date'])]
+
+    @staticmethod
+    def make_key(simulation_id, crypto_traded, currency_quoted, period_interval, date):
+        return f"{simulation_id}:{crypto_traded}:{currency_quoted}:{period_interval}:{date}"
+
+
+class LatestSignal(SignalResponse):
+    '''
+        Description:
+            Latest candle with a signal, one row per (simulation, currency, quote, interval), so Signal.get_signal without a date is a single primary key lookup. Replaced at the end of Signal.update_signal, deleted until then when its candles or trend are written again (see invalidate).
+
+        Attributes:
+            key (str): "simulation_id:crypto_traded:currency_quoted:period_interval" (see make_key)
+            other fields: see SignalResponse
+    '''
+    key = models.CharField(max_length=100, primary_key=True)
+
+    @staticmethod
+    def make_key(simulation_id, crypto_traded, currency_quoted, period_interval):
+        return f"{simulation_id}:{crypto_traded}:{currency_quoted}:{period_interval}"
+
+
+class SignalVersion(models.Model):
+    '''
+        Description:
+            Data version of the signals of one currency and simulation. Bumped by every step that can change a signal response (ingest, trend links, update_signal) so cached responses are invalidated exactly.
+
+        Attributes:
+            simulation_id (int): Simulation the version applies to
+            crypto_traded (str): cryptocurrency being tracked
+            version (int): incremented on every change
+            update_timestamp (datetime): when version was last incremented
+    '''
+    simulation_id = models.IntegerField()
+    crypto_traded = models.CharField(max_length=3)
+    version = models.BigIntegerField(default=0)
+    update_timestamp = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('simulation_id', 'crypto_traded')
+
+    def __str__(self):
+        return f"{self.simulation_id} | {self.crypto_traded} | {self.version}"
+
+    @classmethod
+    def current(cls, simulation_id, crypto_traded):
+        '''
+            Returns the version (0 if the scope never changed). Never writes, so it is safe on the read replica.
+        '''
+        version = cls.objects.filter(simulation_id=simulation_id, crypto_traded=crypto_traded).values_list('version', flat=True).first()
+        return version or 0
+
+    @classmethod
+    def scope(cls, currencies, simulation_ids=None):
+        '''
+            Returns the versions of the given currencies for the given simulations (all simulations when None).
+        '''
+        versions = cls.objects.filter(crypto_traded__in=currencies)
+        if simulation_ids:
+            versions = versions.filter(simulation_id__in=simulation_ids)
+        return versions
+
+    @classmethod
+    def bump(cls, crypto_traded, simulation_id=None):
+        '''
+            Increments the version of the currency for one simulation (every simulation when simulation_id is None).
+        '''
+        simulation_ids = [simulation_id] if simulation_id is not None else list(Simulation.objects.values_list('id', flat=True))
+        for sim_id in simulation_ids:
+            updated = cls.objects.filter(simulation_id=sim_id,
+                                         crypto_traded=crypto_traded
+                                         ).update(version=models.F('version') + 1, update_timestamp=timezone.now())
+            if not updated:
+                cls.objects.create(simulation_id=sim_id, crypto_traded=crypto_traded, version=1)
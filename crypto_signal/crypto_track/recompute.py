@@ -0,0 +1,104 @@
+from crypto_track.models import CryptoCandle, Simulation, source_code
+from crypto_track.candle_store import CandleStore
+from crypto_track.signal import Signal
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from django.db import connections
+import django
+import time
+
+
+def init_worker():
+    # forked workers must not reuse the database connections of the parent.
+    django.setup()
+    connections.close_all()
+
+
+def recompute_signal(simulation_id, currency, options, inputs=None):
+    '''
+        Full update_signal of one simulation and currency, run in a worker process (or in this one when a serial run shares its StrategyInputs).
+
+        Return value:
+        Dictionary with status, message and seconds spent, or the error raised.
+    '''
+    started = time.monotonic()
+    try:
+        my_signal = Signal(currency=currency,
+                           simulation_id=simulation_id,
+                           period_interval=options.get('interval', '1d'),
+                           inputs=inputs)
+        my_signal.prediction_days = options.get('days', 90)
+        message = my_signal.update_signal(engine=options.get('engine', 'vector'),
+                                          mode=options.get('mode', 'full'))
+    except Exception as exc:
+        return {"status": "Conflict",
+                "type": type(exc).__name__,
+                "message": exc.__str__(),
+                "seconds": round(time.monotonic() - started, 3)}
+    finally:
+        if inputs is None:
+            connections.close_all()
+    return {"status": "Accepted",
+            "message": message,
+            "seconds": round(time.monotonic() - started, 3)}
+
+
+class SignalRecompute():
+    '''
+        Recalculates the signals of every (simulation, currency) pair, one worker process per pair.
+        The candle store of each currency is refreshed once before the pairs fan out, so every worker maps the same files instead of reloading candles (their own refresh finds nothing new).
+        SQLite lets one worker write at a time, the others wait up to the timeout set in settings.DATABASES.
+
+        Attributes:
+            Optional:
+                currencies (list of str): cryptocurrencies to recompute. Default = every currency with candles
+                simulation_ids (list of int): simulations to recompute. Default = every Simulation
+                options (dict): same params as /update/<simulation_id>/signal (interval, engine, mode, days)
+                max_workers (int): number of worker processes. Default = number of CPUs, 1 = run in this process with Signal.update_all (inputs loaded once per currency)
+    '''
+
+    def __init__(self,
+                 currencies=None,
+                 simulation_ids=None,
+                 options=None,
+                 max_workers=None
+                 ):
+
+        self.options = options if options is not None else {}
+        self.period_interval = self.options.get('interval', '1d')
+        self.currencies = currencies or list(CryptoCandle.objects.filter(period_interval=self.period_interval
+                                                                         ).values_list('crypto_traded', flat=True).distinct().order_by('crypto_traded'))
+        self.simulation_ids = simulation_ids or list(Simulation.objects.values_list('id', flat=True).order_by('id'))
+        self.max_workers = max_workers
+
+    def run(self):
+        '''
+            Return value:
+            Dictionary with results ("simulation_id:currency": result of recompute_signal) and seconds spent on the whole run.
+        '''
+        started = time.monotonic()
+        for currency in self.currencies:
+            CandleStore(currency=currency,
+                        period_interval=self.period_interval,
+                        source=source_code("Nomics")
+                        ).refresh()
+
+        results = {}
+        if self.max_workers == 1:
+            # one pass per currency, every strategy shares the loaded inputs.
+            for currency in self.currencies:
+                inputs = Signal(currency, self.simulation_ids[0], period_interval=self.period_interval).inputs
+                for simulation_id in self.simulation_ids:
+                    results[f"{simulation_id}:{currency}"] = recompute_signal(simulation_id, currency, self.options, inputs)
+        else:
+            # children are forked, they must open their own connections.
+            connections.close_all()
+
+            with ProcessPoolExecutor(max_workers=self.max_workers, initializer=init_worker) as executor:
+                pending = {executor.submit(recompute_signal, simulation_id, currency, self.options): f"{simulation_id}:{currency}"
+                           for currency in self.currencies
+                           for simulation_id in self.simulation_ids}
+                for future in as_completed(pending):
+                    results[pending[future]] = future.result()
+
+        return {"results": dict(sorted(results.items())),
+                "seconds": round(time.monotonic() - started, 3)}
@@ -0,0 +1,180 @@
+from django.conf import settings
+import datetime
+import hashlib
+import json
+import os
+import pickle
+import tempfile
+import threading
+import time
+
+
+class ResponseCache():
+    '''
+        Disk cache for responses of upstream APIs (Nomics, Google Trends). Entries are content-addressed by a hash of source, endpoint and parameters.
+        Responses for a window fully in the past never change so they never expire, responses that include today expire after ttl seconds.
+        When the cache grows over max_bytes the least recently used entries are removed. The size of each directory is counted once and then kept as a running total, so the directory is only walked again when it is over the limit.
+
+        Attributes:
+            directory (str): where entries are stored. None disables the cache. Default = settings.RESPONSE_CACHE_DIR
+            max_bytes (int): maximum total size of the entries. Default = settings.RESPONSE_CACHE_MAX_BYTES
+            ttl (int): seconds before an entry that includes today expires. Default = settings.RESPONSE_CACHE_TTL
+        Defaults are read from settings on every use, so override_settings applies to the shared response_cache.
+    '''
+
+    def __init__(self, directory=None, max_bytes=None, ttl=None):
+        self._directory = directory
+        self._max_bytes = max_bytes
+        self._ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        # directory: total bytes of its entries (counted on the first write)
+        self.sizes = {}
+        self.lock = threading.Lock()
+
+    @property
+    def directory(self):
+        return self._directory if self._directory is not None else getattr(settings, 'RESPONSE_CACHE_DIR', None)
+
+    @property
+    def max_bytes(self):
+        return self._max_bytes if self._max_bytes is not None else getattr(settings, 'RESPONSE_CACHE_MAX_BYTES', 500 * 1024 * 1024)
+
+    @property
+    def ttl(self):
+        return self._ttl if self._ttl is not None else getattr(settings, 'RESPONSE_CACHE_TTL', 60 * 60)
+
+    def path(self, source, endpoint, params):
+        key = json.dumps([source, endpoint, params], sort_keys=True, default=str)
+        digest = hashlib.sha256(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, digest[:2], f"{digest}.pickle")
+
+    def get(self, source, endpoint, params):
+        '''
+            Returns the cached response or None if it is missing or expired.
+        '''
+        if not self.directory:
+            return None
+
+        path = self.path(source, endpoint, params)
+        try:
+            with open(path, 'rb') as cache_file:
+                entry = pickle.load(cache_file)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            entry = None
+
+        if entry is not None and entry['expires_at'] is not None and entry['expires_at'] < time.time():
+            self.remove(path)
+            entry = None
+
+        with self.lock:
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+
+        # Bump modification time so eviction removes least recently used entries first.
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        return entry['value']
+
+    def set(self, source, endpoint, params, value, expires=False):
+        '''
+            Stores a response. expires=True for responses that include today (they can still change upstream).
+        '''
+        directory = self.directory
+        if not directory:
+            return
+
+        path = self.path(source, endpoint, params)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        entry = {'expires_at': time.time() + self.ttl if expires else None, 'value': value}
+        replaced = self.file_size(path)
+
+        # Write to a temporary file first so a crash never leaves half an entry behind.
+        handle, temp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(handle, 'wb') as cache_file:
+            pickle.dump(entry, cache_file, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(temp_path, path)
+
+        with self.lock:
+            if directory in self.sizes:
+                self.sizes[directory] += self.file_size(path) - replaced
+            else:
+                self.sizes[directory] = sum(size for _, size, _ in self.entries())
+            over_limit = self.sizes[directory] > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def evict(self):
+        '''
+            Removes least recently used entries until the cache fits in max_bytes, and recounts the size of the directory (other processes may write to it too).
+        '''
+        directory = self.directory
+        entries = self.entries()
+        total = sum(size for _, size, _ in entries)
+        for path, size, _ in sorted(entries, key=lambda entry: entry[2]):
+            if total <= self.max_bytes:
+                break
+            self.remove(path)
+            total -= size
+        with self.lock:
+            self.sizes[directory] = total
+
+    def entries(self):
+        # list of (path, size, last used) for every entry
+        entries = []
+        if not self.directory or not os.path.isdir(self.directory):
+            return entries
+        for folder, _, file_names in os.walk(self.directory):
+            for file_name in file_names:
+                if file_name.endswith('.pickle'):
+                    path = os.path.join(folder, file_name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    entries.append((path, stat.st_size, stat.st_mtime))
+        return entries
+
+    def remove(self, path):
+        size = self.file_size(path)
+        try:
+            os.remove(path)
+        except OSError:
+            return
+        with self.lock:
+            if self.directory in self.sizes:
+                self.sizes[self.directory] -= size
+
+    def file_size(self, path):
+        # 0 when there is no entry at path
+        try:
+            return os.stat(path).st_size
+        except OSError:
+            return 0
+
+    def stats(self):
+        entries = self.entries()
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "entries": len(entries),
+                "bytes": sum(size for _, size, _ in entries)}
+
+    def includes_today(self, end_date):
+        '''
+            True if a window ending on end_date (yyyy-mm-dd, blank = open ended) can still change upstream.
+        '''
+        if not end_date:
+            return True
+        try:
+            end_date = datetime.datetime.strptime(str(end_date)[:10], '%Y-%m-%d').date()
+        except ValueError:
+            return True
+        return end_date >= datetime.datetime.utcnow().date()
+
+
+# Shared by every loader in this process so hit/miss counters add up.
+response_cache = ResponseCache()
@@ -0,0 +1,137 @@
+from crypto_track.models import CryptoCandle, ROLLUP_PREFIX, source_code
+from crypto_track.candle_writer import CandleWriter, candles_written
+from crypto_track.candle_store import CandleStore
+from django.conf import settings
+from django.dispatch import receiver
+import numpy as np
+import pandas as pd
+
+
+def interval_delta(period_interval):
+    '''
+        Returns the length of a period_interval (ie. 1m, 1h, 4h, 1d) as a pandas Timedelta.
+    '''
+    return pd.Timedelta(period_interval)
+
+
+class CandleRollup():
+    '''
+        Materializes coarser candles (ie. 4h, 1d) from the candles of a finer base interval, so any interval can be used by Signal and Stocker after loading the finest granularity once.
+        Buckets are aligned to the Unix epoch (1d buckets start at 00:00 UTC) and computed with NumPy over the base CandleStore. Only complete buckets (every base candle present) are written, the current period is rolled up once it closes.
+        Rollup candles keep the source key of their base, so they are found with it, but their data_source starts with ROLLUP_PREFIX (ie. "Rollup 1h Nomics https://api.nomics.com/v1/candles"): candles loaded directly for the coarser interval are never replaced by a rollup, and loading them later replaces the rollup.
+
+        Attributes (align with CryptoCandle model):
+            Required:
+                currency (str): cryptocurrency being tracked
+                data_source (str): data source of the base candles
+            Optional:
+                currency_quoted (str): currency used for the prices. Default = USD
+                base_interval (str): interval of the candles to roll up. Default = 1h
+    '''
+
+    def __init__(self,
+                 currency,
+                 data_source,
+                 currency_quoted="USD",
+                 base_interval="1h"
+                 ):
+
+        self.currency = currency
+        self.data_source = data_source
+        self.currency_quoted = currency_quoted
+        self.base_interval = base_interval
+        self.store = CandleStore(currency=currency,
+                                 currency_quoted=currency_quoted,
+                                 period_interval=base_interval,
+                                 source=source_code(data_source)
+                                 )
+
+    @classmethod
+    def for_source(cls, currency, source, currency_quoted="USD", base_interval="1h"):
+        '''
+            Returns a CandleRollup for base candles stored with the given source key (ie. nomics), or None if there are none.
+        '''
+        data_source = CryptoCandle.objects.filter(crypto_traded=currency,
+                                                  currency_quoted=currency_quoted,
+                                                  period_interval=base_interval,
+                                                  source=source
+                                                  ).exclude(data_source__startswith=ROLLUP_PREFIX).values_list('data_source', flat=True).first()
+        if data_source is None:
+            return None
+        return cls(currency, data_source, currency_quoted=currency_quoted, base_interval=base_interval)
+
+    def run(self, period_interval, since=None):
+        '''
+            Writes period_interval candles for every complete bucket that contains a base candle at or after since (datetime, None = all buckets). Buckets with a candle loaded directly for period_interval are skipped.
+
+            Return value:
+            Tuple of (inserted, updated) record counts.
+        '''
+        step = interval_delta(period_interval).value
+        base_step = interval_delta(self.base_interval).value
+        if step <= base_step or step % base_step:
+            raise ValueError(f"{period_interval} is not a multiple of the {self.base_interval} base interval.")
+
+        arrays = self.store.arrays()
+        timestamps = arrays['period_start'].view('int64')
+        first = 0
+        if since is not None:
+            # start at the beginning of the bucket of since so partial buckets are recomputed in full.
+            since = pd.Timestamp(since)
+            since = since.tz_localize('UTC') if since.tzinfo is None else since.tz_convert('UTC')
+            bucket_start = since.value // step * step
+            first = int(np.searchsorted(timestamps, bucket_start))
+        if first == len(timestamps):
+            return 0, 0
+
+        buckets = timestamps[first:] // step * step
+        starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+        ends = np.r_[starts[1:], len(buckets)] - 1
+        bucket_timestamps = np.char.add(np.datetime_as_string(buckets[starts].astype('datetime64[ns]'), unit='s'), 'Z')
+
+        writer = CandleWriter(currency=self.currency,
+                              data_source=f"{ROLLUP_PREFIX}{self.base_interval} {self.data_source}",
+                              currency_quoted=self.currency_quoted,
+                              period_interval=period_interval,
+                              source=self.store.source
+                              )
+        loaded = set(CryptoCandle.objects.filter(crypto_traded=self.currency,
+                                                 currency_quoted=self.currency_quoted,
+                                                 period_interval=period_interval,
+                                                 source=writer.source,
+                                                 period_start_timestamp__gte=bucket_timestamps[0]
+                                                 ).exclude(data_source__startswith=ROLLUP_PREFIX).values_list('period_start_timestamp', flat=True))
+        # a bucket is complete when it has one base candle per base interval (the base candles are unique per period_start)
+        keep = (ends - starts + 1 == step // base_step) & ~np.isin(bucket_timestamps, list(loaded))
+
+        columns = {'open': arrays['period_open'][first:][starts],
+                   'high': np.maximum.reduceat(arrays['period_high'][first:], starts),
+                   'low': np.minimum.reduceat(arrays['period_low'][first:], starts),
+                   'close': arrays['period_close'][first:][ends],
+                   'volume': np.add.reduceat(arrays['period_volume'][first:], starts),
+                   }
+        candles = [writer.build_candle({'timestamp': str(bucket_timestamps[i]),
+                                        'open': columns['open'][i],
+                                        'high': columns['high'][i],
+                                        'low': columns['low'][i],
+                                        'close': columns['close'][i],
+                                        'volume': columns['volume'][i]})
+                   for i in np.flatnonzero(keep)]
+        return writer.write(candles)
+
+
+@receiver(candles_written)
+def roll_up_written(sender, writer, since, **kwargs):
+    '''
+        Recomputes the configured rollups (settings.ROLLUP_INTERVALS) of the buckets touched by a CandleWriter. Rollups are not rolled up again, every coarser interval is computed from the loaded candles.
+    '''
+    targets = getattr(settings, 'ROLLUP_INTERVALS', {}).get(writer.period_interval, [])
+    if not targets or writer.data_source.startswith(ROLLUP_PREFIX):
+        return
+    rollup = CandleRollup(writer.currency,
+                          writer.data_source,
+                          currency_quoted=writer.currency_quoted,
+                          base_interval=writer.period_interval
+                          )
+    for period_interval in targets:
+        rollup.run(period_interval, since=since)
@@ -1,8 +1,14 @@
-from crypto_track.models import CryptoCandle, SignalSimulation, Simulation, CryptoProphet
+from crypto_track.models import CryptoCandle, SignalSimulation, Simulation, CryptoProphet, SignalLookup, LatestSignal, SignalVersion, source_code
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
 from crypto_track.transaction import BankTransaction
+from crypto_track.candle_store import CandleStore
+from crypto_track.rollup import interval_delta
+from crypto_track.track_exception import TrackException
 from crypto_track.stocker import Stocker
+from crypto_track.signal_vector import VectorSignal
+from crypto_track.strategies import StrategyInputs, get_strategy
 import pandas
 
 
@@ -16,6 +22,9 @@ class Signal():
                 currency_quoted (str): currency used for the prices. Default = USD
                 period_interval (str): Time interval of the candle. Default 1d = 1 day (daily)
                 data_source_short (str): short version of data source field from CryptoCandle model. Default = Nomics
+                inputs (StrategyInputs): data shared with other Signals of the same market. Default = loaded for this Signal
+
+        The signal rules of each simulation are the Strategy registered for it in crypto_track/strategies.py.
     '''
 
     def __init__(self,
@@ -23,7 +32,8 @@ class Signal():
                  simulation_id,
                  currency_quoted="USD",
                  period_interval="1d",
-                 data_source_short="Nomics"
+                 data_source_short="Nomics",
+                 inputs=None
                  ):
 
         self.currency = currency
@@ -38,20 +48,52 @@ class Signal():
         self.candle_subset = CryptoCandle.objects.filter(crypto_traded=self.currency,
                                                          currency_quoted=self.currency_quoted,
                                                          period_interval=self.period_interval,
-                                                         data_source__contains=self.data_source_short
+                                                         source=source_code(self.data_source_short)
                                                          )
-        self.simulation_obj = get_object_or_404(Simulation, pk=self.simulation_id)
+        self._simulation_obj = None
+        self.store = CandleStore(currency=self.currency,
+                                 currency_quoted=self.currency_quoted,
+                                 period_interval=self.period_interval,
+                                 source=source_code(self.data_source_short)
+                                 )
+        self.strategy = get_strategy(simulation_id)
+        self.inputs = inputs if inputs is not None else StrategyInputs(self.store, self.candle_subset)
+
+    @property
+    def simulation_obj(self):
+        # fetched on first use, a signal read served by SignalLookup never needs it.
+        if self._simulation_obj is None:
+            self._simulation_obj = get_object_or_404(Simulation, pk=self.simulation_id)
+        return self._simulation_obj
+
+    def lookup_key(self, search_date):
+        return SignalLookup.make_key(self.simulation_id, self.currency, self.currency_quoted, self.period_interval, search_date)
+
+    def latest_key(self):
+        return LatestSignal.make_key(self.simulation_id, self.currency, self.currency_quoted, self.period_interval)
 
     def get_signal(self, search_date):
+        '''
+            Retrieves signal details for the date (latest available when date is blank). Dates are read from SignalLookup and the latest signal from LatestSignal with a single primary key lookup, falling back to the candle and simulation models when they do not have it.
+        '''
+        try:
+            if search_date:
+                return SignalLookup.objects.get(pk=self.lookup_key(search_date)).message()
+            return LatestSignal.objects.get(pk=self.latest_key()).message()
+        except (SignalLookup.DoesNotExist, LatestSignal.DoesNotExist):
+            return self.query_signal(search_date)
+
+    def query_signal(self, search_date):
         '''
             Retrieves CryptoCandle object based on class parameters and date.
         '''
 
         # date is not required, if user does not specify then we provide the latest
         if search_date:
-            my_candle = get_object_or_404(self.candle_subset,
-                                          period_start_timestamp__startswith=search_date
-                                          )
+            # intraday intervals have several candles per date, we return the last one of the day.
+            my_candle = self.candle_subset.filter(period_date=search_date).order_by('-period_start').first()
+            if my_candle is None:
+                raise TrackException(f"There is no {self.period_interval} candle for {self.currency} on {search_date}.", "Not Found")
             # Check if there is a signal for th specified date
             try:
                 my_signal = get_object_or_404(SignalSimulation,
@@ -72,9 +114,9 @@ class Signal():
                                                             crypto_candle__crypto_traded=self.currency,
                                                             crypto_candle__currency_quoted=self.currency_quoted,
                                                             crypto_candle__period_interval=self.period_interval,
-                                                            crypto_candle__data_source__contains=self.data_source_short
+                                                            crypto_candle__source=source_code(self.data_source_short)
                                                             )
-            my_signal = signal_subset.order_by('-crypto_candle__period_start_timestamp')[0]
+            my_signal = signal_subset.order_by('-crypto_candle__period_start')[0]
             my_candle = my_signal.crypto_candle
 
         if my_signal:
@@ -100,27 +142,103 @@ class Signal():
                           }
         return return_message
 
-    def update_signal(self):
+    @classmethod
+    def update_all(cls, currency, simulation_ids=None, currency_quoted="USD", period_interval="1d", prediction_days=90, **options):
+        '''
+            Runs update_signal for several simulations (all when None) of one market in a single pass: candles, trends and forecasts are loaded once and shared by every strategy.
+            options: params of update_signal (engine, mode, start).
+
+            Return value:
+            Dictionary of simulation_id: message of update_signal.
         '''
-            Loops through candle subset to update signal and bank estimates. One-time update each time the data sources are updated.
-            TODO (reminder): allow optional start/end date parameters
+        if not simulation_ids:
+            simulation_ids = list(Simulation.objects.values_list('id', flat=True).order_by('id'))
+        first = cls(currency, simulation_ids[0], currency_quoted=currency_quoted, period_interval=period_interval)
+        first.store.refresh()
+
+        messages = {}
+        for simulation_id in simulation_ids:
+            my_signal = cls(currency, simulation_id, currency_quoted=currency_quoted, period_interval=period_interval, inputs=first.inputs)
+            my_signal.prediction_days = prediction_days
+            messages[simulation_id] = my_signal.update_signal(**options)
+        return messages
+
+    def update_signal(self, engine="vector", mode="full", start=None):
+        '''
+            Updates signal and bank estimates of the candle subset. One-time update each time the data sources are updated.
+            engine: "vector" computes all signals at once with VectorSignal and bulk inserts them, "loop" calculates and saves them one candle at a time.
+            mode: "full" recomputes every candle, "incremental" only the candles from start (date, default = the last candle with a signal) on, continuing from the stored signals and bank before it. Strategies that are not incremental (forecasts) are always recomputed in full.
+        '''
+        since = self.incremental_start(start) if mode == "incremental" else None
+
+        # Next, delete the existing simulation of the candle subset (other intervals, quotes and sources keep theirs)
+        recomputed = self.candle_subset if since is None else self.candle_subset.filter(period_start__gte=since)
+        SignalSimulation.objects.filter(simulation=self.simulation_obj,
+                                        crypto_candle__in=recomputed).delete()
+
+        # Candles are read from the columnar store, pick up anything written since the last refresh first.
+        self.store.refresh()
+
+        conditional_message = self.strategy.prepare(self, self.inputs)
+        if engine == "vector":
+            sims = VectorSignal(self).signals(since)
+            SignalSimulation.objects.bulk_create(sims, batch_size=500)
+            x = sum(1 for sim in sims if sim.candle_compare_id is not None)
+        else:
+            x = self.loop_signals(since)
+
+        # Once we have updated all signals, we can model transaction history.
+        transaction_sim = BankTransaction(self.candle_subset, self.simulation_obj, self.currency)
+        transaction_sim.transaction_history(start=since)
+
+        self.rebuild_lookup(since)
+        SignalVersion.bump(self.currency, self.simulation_id)
+
+        return f"Inserted {x} signal records on {timezone.now()}.{conditional_message}"
+
+    def incremental_start(self, start):
+        '''
+            Returns the period_start from which an incremental update recomputes signals, or None when every candle has to be recomputed (no signals before start or a simulation that is not incremental).
+        '''
+        if not self.strategy.incremental:
+            return None
+        computed = SignalSimulation.objects.filter(simulation_id=self.simulation_id, crypto_candle__in=self.candle_subset)
+        if start:
+            since = pandas.Timestamp(start)
+            since = (since.tz_localize('UTC') if since.tzinfo is None else since).to_pydatetime()
+        else:
+            # the last computed candle may have been replaced by a later load, so it is recomputed too.
+            since = computed.order_by('-crypto_candle__period_start').values_list('crypto_candle__period_start', flat=True).first()
+            if since is None:
+                return None
+        if self.strategy.order == "reverse":
+            # the signal of the candle before since is compared with the first recomputed candle.
+            since = self.candle_subset.filter(period_start__lt=since).order_by('-period_start').values_list('period_start', flat=True).first() or since
+        if not computed.filter(crypto_candle__period_start__lt=since).exists():
+            return None
+        return since
+
+    def loop_signals(self, since=None):
+        '''
+            Creates the SignalSimulation of each candle one at a time (only candles from since on when given).
+
+            Return value:
+            Number of signals calculated.
         '''
         # initiate variables to be used in loop
         prior_candle = None
+        period_delta = interval_delta(self.period_interval)
         x = 0
-        conditional_message = ''
 
-        # Next, delete the existing simulation
-        SignalSimulation.objects.filter(simulation=self.simulation_obj,
-                                        crypto_candle__crypto_traded=self.currency).delete()
+        # The only time we want to see the future first is when we are determining hindsight simulations (strategy order = reverse).
+        loop_candles = self.store.candles(with_trend=self.strategy.with_trend, reverse=self.strategy.order == "reverse")
 
-        # The only time we want to see the future first is when we are determining hindsight simulations.
-        if self.simulation_id in [2, 4, 5]:
-            loop_candles = self.candle_subset.order_by('-period_start_timestamp')
-            if self.simulation_id in [4, 5]:
-                conditional_message += ' ' + self.predict_price()
-        else:
-            loop_candles = self.candle_subset.filter(search_trend__isnull=False).order_by('period_start_timestamp')
+        if since is not None:
+            later = [candle for candle in loop_candles if candle.period_start >= since]
+            # forward strategies compare the first recomputed candle with the last one before since.
+            if self.strategy.order == "forward" and len(later) < len(loop_candles):
+                prior_candle = loop_candles[len(loop_candles) - len(later) - 1]
+            loop_candles = later
 
         for candle in loop_candles:
             # For initial candle, we will initialize the simulation and bank and do nothing else.
@@ -131,13 +249,10 @@ class Signal():
                 my_sim.save()
 
             else:
-                days_diff = 0
-                if candle.search_trend and prior_candle.search_trend:
-                    candle_delta = candle.search_trend.date - prior_candle.search_trend.date
-                    days_diff = candle_delta.days
+                # only compare consecutive candles (no gap in the data) of our period interval when the strategy asks for it.
+                is_next_period = abs(candle.period_start - prior_candle.period_start) == period_delta
 
-                # below i want to make sure my delta is working along with my period interval. This will need to be updated once we introduce hourly intervals.
-                if ((self.period_interval == "1d" and days_diff == 1) or self.simulation_id in [2, 4, 5]):
+                if (is_next_period or not self.strategy.consecutive):
 
                     sim_result = self.calculate_signal(candle, prior_candle)
                     # counting our success instances
@@ -145,33 +260,85 @@ class Signal():
                         x += 1
             prior_candle = candle
 
-        # Once we have updated all signals, we can model transaction history.
-        transaction_sim = BankTransaction(self.candle_subset, self.simulation_obj, self.currency)
-        transaction_sim.transaction_history()
+        return x
 
-        return f"Inserted {x} signal records on {timezone.now()}.{conditional_message}"
+    def rebuild_lookup(self, since=None):
+        '''
+            Replaces the SignalLookup rows of this simulation and market with one row per candle date (only dates from since on when given), read with two queries, and the LatestSignal row with the latest candle that has a signal.
+        '''
+        lookups = SignalLookup.objects.filter(simulation_id=self.simulation_id,
+                                              crypto_traded=self.currency,
+                                              currency_quoted=self.currency_quoted,
+                                              period_interval=self.period_interval
+                                              )
+        if since is not None:
+            # whole dates are rebuilt, intraday intervals keep the last candle of the day.
+            lookups = lookups.filter(date__gte=since.date())
+        rows, latest = self.lookup_rows(start=since.date() if since is not None else None)
+
+        with transaction.atomic():
+            lookups.delete()
+            SignalLookup.objects.bulk_create(rows.values(), batch_size=500)
+            # with since, an older latest signal is still valid when no recomputed candle has one.
+            if latest is not None or since is None:
+                LatestSignal.objects.filter(pk=self.latest_key()).delete()
+            if latest is not None:
+                LatestSignal.objects.create(key=self.latest_key(), **latest)
+
+        return len(rows)
+
+    def lookup_rows(self, start=None, end=None):
+        '''
+            Reads the SignalLookup rows of the candle dates from start to end (dates, None = unbounded) with two queries, without saving them.
+
+            Return value:
+            Tuple of (dictionary of date: unsaved SignalLookup ordered by date, field values of the latest candle with a signal or None).
+        '''
+        candles = self.candle_subset
+        if start is not None:
+            candles = candles.filter(period_date__gte=start)
+        if end is not None:
+            candles = candles.filter(period_date__lte=end)
+
+        signals = {}
+        for candle_id, compare_timestamp, compare_close, signal in SignalSimulation.objects.filter(
+                simulation_id=self.simulation_id,
+                crypto_candle__in=candles
+        ).values_list('crypto_candle_id', 'candle_compare__period_start_timestamp', 'candle_compare__period_close', 'signal'):
+            signals[candle_id] = (compare_timestamp, compare_close, signal)
+
+        rows = {}
+        latest = None
+        for candle_id, timestamp, period_date, period_close, trend_ratio in candles.order_by('period_start').values_list(
+                'id', 'period_start_timestamp', 'period_date', 'period_close', 'search_trend__trend_ratio'):
+            values = {"simulation_id": self.simulation_id,
+                      "crypto_traded": self.currency,
+                      "currency_quoted": self.currency_quoted,
+                      "period_interval": self.period_interval,
+                      "date": period_date,
+                      "timestamp": timestamp,
+                      "period_close": period_close,
+                      }
+            # signal details are left blank for candles without a signal, same as get_signal.
+            if candle_id in signals:
+                compare_timestamp, compare_close, signal = signals[candle_id]
+                values.update(comparison_period_date=compare_timestamp[:10] if compare_timestamp else None,
+                              comparison_period_close=compare_close,
+                              trend_ratio=trend_ratio,
+                              simulation_name=self.simulation_obj.name,
+                              signal=signal)
+                if signal is not None:
+                    latest = values
+            # ordered by period_start, so intraday intervals keep the last candle of each date.
+            rows[period_date] = SignalLookup(key=self.lookup_key(period_date), **values)
+
+        return rows, latest
 
     def calculate_signal(self, candle, compare_candle):
         '''
             Creates SignalSimulation object for candle provided.
         '''
-        # default values for price difference
-        p_default = {1: 80, 3: 0.01}
-
-        if self.simulation_id in [1, 3]:
-            calc_signal = self.calculate_signal_v1(candle, compare_candle, p_default[self.simulation_id])
-        elif self.simulation_id == 2:
-            calc_signal = self.calculate_signal_hindsight(candle, compare_candle.period_close)
-        elif self.simulation_id == 4:
-            calc_signal = self.calculate_signal_prophet(compare_candle)
-        elif self.simulation_id == 5:
-            calc_signal = self.calculate_signal_prophet(compare_candle)
-            # Signal #5 is almost equivalent to #4 but takes into account Google Trend ratio
-            if candle.search_trend:
-                if candle.search_trend.trend_ratio and candle.search_trend.trend_ratio > 0.35:
-                    calc_signal = "BUY"
-        else:
-            calc_signal = ""
+        calc_signal = self.strategy.calculate(candle, compare_candle, self.inputs)
 
         my_sim = SignalSimulation(crypto_candle=candle,
                                   simulation=self.simulation_obj,
@@ -181,85 +348,9 @@ class Signal():
 
         return my_sim
 
-    def calculate_signal_v1(self, candle, prior_period_candle, price_diff_default, trend_ratio_default=0.35):
-        '''
-            Calculates Version 1.0 of signal (based on Marc Howard's blog):
-            BUY signal:
-                1. Search terms of “Buy Bitcoin” to “BTC USD” ratio is higher than 35%.
-                2. BTC price difference closes more than $80 above the prior day’s close price.
-            SELL signal:
-                BUY signal requirements not met.
-        '''
-
-        # calculate differences for current candle
-        my_changes = self.get_change_in_candle(candle, prior_period_candle)
-
-        price_diff = my_changes[0]
-        my_trend_ratio = my_changes[1]
-
-        if my_trend_ratio is None:
-            calc_signal = "HOLD"
-        elif my_trend_ratio > trend_ratio_default and price_diff > price_diff_default:
-            calc_signal = "BUY"
-        else:
-            calc_signal = "SELL"
-
-        return calc_signal
-
-    def get_change_in_candle(self, candle, prior_period_candle):
-        # get price difference
-        # for first sim we are using simple substract from prior to current price
-        if self.simulation_id == 1:
-            price_diff = candle.period_close - prior_period_candle.period_close
-        # for #3 sim we are using % difference
-        elif self.simulation_id == 3:
-            price_diff = (candle.period_close - prior_period_candle.period_close) / prior_period_candle.period_close
-        if candle.search_trend:
-            my_trend_ratio = candle.search_trend.trend_ratio
-        else:
-            my_trend_ratio = None
-        return price_diff, my_trend_ratio
-
-    def calculate_signal_hindsight(self, candle, next_candle_price):
-        '''
-            Calculates Hindsight version of signal:
-            BUY signal:
-                -- Next candle price close is higher (buy before increase).
-            SELL signal:
-                -- Next candle price close is lower (sell at peak).
-        '''
-        if candle.period_close > next_candle_price:
-            calc_signal = "SELL"
-        elif candle.period_close < next_candle_price:
-            calc_signal = "BUY"
-        else:
-            # Hold signal from prior day. Note: Since ideally we do not want HOLD, need to update code to copy BUY/SELL from prior day.
-            calc_signal = "HOLD"
-
-        return calc_signal
-
-    def calculate_signal_prophet(self, next_candle):
-        try:
-            my_prophet = get_object_or_404(CryptoProphet,
-                                           crypto_candle=next_candle,
-                                           simulation=self.simulation_obj)
-        except:
-            calc_signal = "HOLD"
-
-        else:
-            if float(my_prophet.change) < 0:
-                calc_signal = "SELL"
-            elif float(my_prophet.change) > 0:
-                calc_signal = "BUY"
-            else:
-                # Hold signal from prior day. Note: Since ideally we do not want HOLD, need to update code to copy BUY/SELL from prior day.
-                calc_signal = "HOLD"
-
-        return calc_signal
-
     def predict_price(self):
         # Initialize Stocker object
-        crypto_stocker = Stocker(ticker=self.currency, currency_quoted=self.currency_quoted)
+        crypto_stocker = Stocker(ticker=self.currency, currency_quoted=self.currency_quoted, period_interval=self.period_interval)
 
         # Change defaults as analyzed in Stocker Prediction Usage.ipynb notebook.
         crypto_stocker.training_years = 6
@@ -291,11 +382,7 @@ class Signal():
             ).delete()
             # Check to see if we have an existing CryptoCandle object so we can reference with ForeignKey
             try:
-                candle = CryptoCandle.objects.get(
-                    search_trend__date=row['ds'],
-                    currency_quoted=self.currency_quoted,
-                    period_interval=self.period_interval,
-                    crypto_traded=self.currency)
+                candle = self.candle_subset.get(period_date=row['ds'])
             except:
                 candle = None
 
@@ -0,0 +1,66 @@
+from crypto_track.models import CryptoCandle, LatestSignal, Simulation, SignalLookup, SignalVersion
+from crypto_track.candle_writer import candles_written
+from django.conf import settings
+from django.core.cache import caches
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+import threading
+
+
+class SignalCache():
+    '''
+        Caches GET /<simulation_id>/signal responses in Django's cache framework. Keys include the SignalVersion of the (simulation, currency) scope, so entries never need a timeout: a bumped version makes every older entry unreachable and the cache backend evicts them.
+
+        Attributes:
+            alias (str): Django cache to use. Default = settings.SIGNAL_CACHE_ALIAS
+    '''
+
+    def __init__(self, alias=None):
+        self.alias = alias or getattr(settings, 'SIGNAL_CACHE_ALIAS', 'default')
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def key(self, version, simulation_id, currency, currency_quoted, period_interval, search_date):
+        return f"signal:{simulation_id}:{currency}:{currency_quoted}:{period_interval}:{search_date or 'latest'}:{version}"
+
+    def get(self, key):
+        '''
+            Returns the cached response or None.
+        '''
+        value = caches[self.alias].get(key)
+        with self.lock:
+            if value is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return value
+
+    def set(self, key, value):
+        caches[self.alias].set(key, value, timeout=None)
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses}
+
+
+# Shared by every request in this process so hit/miss counters add up.
+signal_cache = SignalCache()
+
+
+@receiver(candles_written)
+def bump_written(sender, writer, since, **kwargs):
+    # candles (and so the fallback responses of get_signal) changed for every simulation of the currency.
+    SignalVersion.bump(writer.currency)
+    SignalLookup.invalidate(writer.currency, writer.currency_quoted, writer.period_interval, since=since)
+    LatestSignal.invalidate(writer.currency, writer.currency_quoted, writer.period_interval, since=since)
+
+
+@receiver(post_delete, sender=Simulation)
+def drop_deleted_simulation(sender, instance, **kwargs):
+    # its SignalSimulation and Bank rows are deleted by the cascade, the read tables have no foreign key.
+    SignalLookup.objects.filter(simulation_id=instance.pk).delete()
+    LatestSignal.objects.filter(simulation_id=instance.pk).delete()
+    currencies = set(CryptoCandle.objects.values_list('crypto_traded', flat=True).distinct())
+    currencies.update(SignalVersion.objects.filter(simulation_id=instance.pk).values_list('crypto_traded', flat=True))
+    for currency in currencies:
+        SignalVersion.bump(currency, instance.pk)
@@ -0,0 +1,126 @@
+from crypto_track.models import SignalLookup, Simulation
+from crypto_track.signal import Signal
+from django.core.serializers.json import DjangoJSONEncoder
+import csv
+import datetime
+import itertools
+import json
+
+
+class Echo():
+    '''
+        File-like object for csv.writer that returns each line instead of buffering it.
+    '''
+
+    def write(self, value):
+        return value
+
+
+class SignalRange():
+    '''
+        Signals of several simulations and currencies over a date range, read from SignalLookup with one query and yielded row by row (the queryset is consumed with iterator(), so the result is never held in memory).
+        Lookup rows of a market are deleted from the first re-ingested date on until update_signal rebuilds them, so dates after the last lookup row of each (simulation, currency) are read from the candle and simulation models instead (see Signal.lookup_rows).
+
+        Attributes (align with CryptoCandle model):
+            Required:
+                currencies (list of str): cryptocurrencies being tracked
+                start (date): first candle date
+                end (date): last candle date
+            Optional:
+                simulation_ids (list of int): simulations to include. Default = all
+                currency_quoted (str): currency used for the prices. Default = USD
+                period_interval (str): Time interval of the candle. Default 1d = 1 day (daily)
+                data_source_short (str): short version of data source field from CryptoCandle model, read for dates without lookup rows. Default = Nomics
+    '''
+
+    # simulation_id first, then the fields of a /<simulation_id>/signal response
+    fields = ['simulation_id', 'currency', 'currency_quoted', 'date', 'timestamp', 'period_close', 'comparison_period_date',
+              'comparison_period_close', 'trend_ratio', 'simulation_name', 'signal']
+    columns = ['simulation_id', 'crypto_traded', 'currency_quoted', 'date', 'timestamp', 'period_close', 'comparison_period_date',
+               'comparison_period_close', 'trend_ratio', 'simulation_name', 'signal']
+
+    def __init__(self,
+                 currencies,
+                 start,
+                 end,
+                 simulation_ids=None,
+                 currency_quoted="USD",
+                 period_interval="1d",
+                 data_source_short="Nomics"
+                 ):
+
+        self.currencies = currencies
+        self.start = start
+        self.end = end
+        self.simulation_ids = simulation_ids
+        self.currency_quoted = currency_quoted
+        self.period_interval = period_interval
+        self.data_source_short = data_source_short
+
+    def queryset(self):
+        lookups = SignalLookup.objects.filter(crypto_traded__in=self.currencies,
+                                              currency_quoted=self.currency_quoted,
+                                              period_interval=self.period_interval,
+                                              date__range=(self.start, self.end)
+                                              )
+        if self.simulation_ids:
+            lookups = lookups.filter(simulation_id__in=self.simulation_ids)
+        return lookups.order_by('simulation_id', 'crypto_traded', 'date')
+
+    def scopes(self):
+        # (simulation_id, currency) in the order of queryset
+        simulations = Simulation.objects.order_by('id')
+        if self.simulation_ids:
+            simulations = simulations.filter(id__in=self.simulation_ids)
+        return [(simulation_id, currency) for simulation_id in simulations.values_list('id', flat=True) for currency in sorted(set(self.currencies))]
+
+    def rows(self):
+        '''
+            Yields one tuple per candle date, in the order of fields.
+        '''
+        groups = itertools.groupby(self.queryset().values_list(*self.columns).iterator(), key=lambda row: (row[0], row[1]))
+        group = next(groups, None)
+        for scope in self.scopes():
+            # rows of simulations that no longer exist are left out
+            while group is not None and group[0] < scope:
+                group = next(groups, None)
+            last_date = None
+            if group is not None and group[0] == scope:
+                for row in group[1]:
+                    last_date = row[3]
+                    yield row
+                group = next(groups, None)
+            yield from self.missing_rows(scope, last_date)
+
+    def missing_rows(self, scope, last_date):
+        '''
+            Yields the rows of the dates after last_date (the whole range when None) read from the candle and simulation models.
+        '''
+        start = self.start if last_date is None else last_date + datetime.timedelta(days=1)
+        if start > self.end:
+            return
+        simulation_id, currency = scope
+        my_signal = Signal(currency=currency,
+                           simulation_id=simulation_id,
+                           currency_quoted=self.currency_quoted,
+                           period_interval=self.period_interval,
+                           data_source_short=self.data_source_short)
+        rows, _ = my_signal.lookup_rows(start=start, end=self.end)
+        for lookup in rows.values():
+            yield tuple(getattr(lookup, column) for column in self.columns)
+
+    def json_lines(self):
+        '''
+            Yields one JSON object per line, with the same encoding of decimals as JsonResponse.
+        '''
+        for row in self.rows():
+            yield json.dumps(dict(zip(self.fields, row)), cls=DjangoJSONEncoder) + "\n"
+
+    def csv_lines(self):
+        '''
+            Yields a header line followed by one CSV line per row.
+        '''
+        writer = csv.writer(Echo())
+        yield writer.writerow(self.fields)
+        for row in self.rows():
+            yield writer.writerow(row)
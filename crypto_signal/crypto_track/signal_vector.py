@@ -0,0 +1,70 @@
+from crypto_track.models import SignalSimulation
+from crypto_track.rollup import interval_delta
+import numpy as np
+
+
+class VectorSignal():
+    '''
+        Computes the whole signal series of a Signal's strategy at once with Strategy.compute over the CandleStore arrays, instead of one calculate_signal call and save() per candle.
+        Candles are selected and paired the same way as in Signal.loop_signals (strategy order, with_trend and consecutive), so both engines give the same signals.
+
+        Attributes:
+            signal (Signal): signal being updated (strategy, interval and inputs are read from it)
+    '''
+
+    def __init__(self, signal):
+        self.signal = signal
+        self.strategy = signal.strategy
+        self.inputs = signal.inputs
+        self.arrays = self.inputs.arrays()
+
+    def signals(self, since=None):
+        '''
+            since (datetime): only candles from since on are returned. Default = all candles.
+
+            Return value:
+            List of unsaved SignalSimulation objects, in the order the loop engine saves them.
+        '''
+        first, current, compare = self.pairs()
+        if not len(first):
+            return []
+
+        calc_signals = self.strategy.compute(self.arrays, current, compare, self.inputs)
+        ids = self.arrays['id']
+        sims = self.build(ids[first], [None], [None]) + self.build(ids[current], ids[compare].tolist(), list(calc_signals))
+
+        if since is not None:
+            # the whole series costs milliseconds, only rows from since on are written.
+            later = self.arrays['period_start'] >= self.signal.store.to_naive(since)
+            keep = set(ids[later].tolist())
+            sims = [sim for sim in sims if sim.crypto_candle_id in keep]
+        return sims
+
+    def pairs(self):
+        '''
+            Returns the row numbers (in the store arrays) of the candle that starts the simulation (empty when there are no candles), of every candle that gets a signal and of the candles they are compared with, in the walk order of the strategy.
+        '''
+        rows = np.arange(len(self.arrays['id']))
+        if self.strategy.with_trend:
+            rows = np.flatnonzero(~np.isnat(self.arrays['search_trend']))
+        if self.strategy.order == "reverse":
+            rows = rows[::-1]
+
+        # the first candle only starts the simulation, every other one is compared with the one before it in the walk.
+        current = rows[1:]
+        compare = rows[:-1]
+        if self.strategy.consecutive:
+            timestamps = self.arrays['period_start'].view('int64')
+            is_next_period = np.abs(timestamps[current] - timestamps[compare]) == interval_delta(self.signal.period_interval).value
+            current = current[is_next_period]
+            compare = compare[is_next_period]
+        return rows[:1], current, compare
+
+    def build(self, candle_ids, compare_ids, signals):
+        sims = []
+        for candle_id, compare_id, signal in zip(candle_ids.tolist(), compare_ids, signals):
+            sims.append(SignalSimulation(crypto_candle_id=candle_id,
+                                         simulation_id=self.signal.simulation_id,
+                                         candle_compare_id=compare_id,
+                                         signal=signal))
+        return sims
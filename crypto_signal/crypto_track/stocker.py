@@ -6,7 +6,8 @@ import numpy as np
 import fbprophet
 import pytrends
 from pytrends.request import TrendReq
-from crypto_track.models import CryptoCandle
+from crypto_track.models import source_code
+from crypto_track.candle_store import CandleStore
 from django.shortcuts import get_object_or_404
 
 # matplotlib pyplot for plotting
@@ -825,7 +826,7 @@ class Prophet():
 class Stocker(Prophet):
 
     # Initialization requires a ticker symbol
-    def __init__(self, ticker, source='Nomics', currency_quoted = 'USD'):
+    def __init__(self, ticker, source='Nomics', currency_quoted = 'USD', period_interval = '1d'):
 
         # Enforce capitalization
         ticker = ticker.upper()
@@ -836,17 +837,17 @@ class Stocker(Prophet):
 
         # Retrieval the financial data
         # first, initialize variables
-        self.period_interval = '1d'
+        self.period_interval = period_interval
         self.currency_quoted = currency_quoted
         self.source = source
         try:
             # simulation_id = 4 is prophet simulation
-            my_candle = CryptoCandle.objects.filter(crypto_traded=self.symbol,
-                                                    currency_quoted=self.currency_quoted,
-                                                    period_interval=self.period_interval,
-                                                    data_source__contains=self.source
-                                                         )
-            stock = pd.DataFrame(list(my_candle.values()))
+            my_store = CandleStore(currency=self.symbol,
+                                   currency_quoted=self.currency_quoted,
+                                   period_interval=self.period_interval,
+                                   source=source_code(self.source)
+                                   )
+            stock = my_store.frame()
 
         except Exception as e:
             print('Error Retrieving Data.')
@@ -854,11 +855,9 @@ class Stocker(Prophet):
             return
 
         # Columns required for prophet
-        stock['Date'] = pd.to_datetime(stock['period_start_timestamp'], errors='coerce')
+        # Prophet rejects tz-aware ds, dates are kept in naive UTC like the baseline
+        stock['Date'] = pd.to_datetime(stock['period_start'], utc=True).dt.tz_localize(None)
         stock['ds'] = stock['Date']
-        stock['period_close'] = stock.period_close.astype(float)
-        stock['period_open'] = stock.period_open.astype(float)
-        stock['period_volume'] = stock.period_volume.astype(float)
 
         stock['y'] = stock['period_close']
         stock['Daily Change'] = stock['period_close'] - stock['period_open']
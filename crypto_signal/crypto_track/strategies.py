@@ -0,0 +1,292 @@
+from crypto_track.models import CryptoCandle, PyTrends, CryptoProphet
+from crypto_track.candle_store import CandleStore
+import numpy as np
+
+# simulation_id: Strategy, filled by register()
+registry = {}
+
+# relative distance to a threshold under which floats are compared with the exact (Decimal) values instead
+tolerance = 1e-9
+
+close_decimal = CandleStore.decimal_reader(CryptoCandle, 'period_close')
+ratio_decimal = CandleStore.decimal_reader(PyTrends, 'trend_ratio')
+
+
+def register(strategy):
+    '''
+        Adds a strategy to the registry under its simulation_id (replacing the one registered before).
+    '''
+    registry[strategy.simulation_id] = strategy
+    return strategy
+
+
+def get_strategy(simulation_id):
+    '''
+        Returns the strategy registered for the simulation. Unknown simulations get the base Strategy (blank signals), same as before strategies were registered.
+    '''
+    return registry.get(simulation_id) or Strategy(simulation_id)
+
+
+def exceeds(values, threshold, exact, scale=None):
+    '''
+        Returns values > threshold for float arrays. Rows too close to the threshold for float rounding to be safe are decided by exact(i), which compares the values the loop engine uses.
+    '''
+    with np.errstate(invalid='ignore'):
+        result = np.asarray(values > threshold)
+    scale = np.abs(threshold) if scale is None else scale
+    for i in np.flatnonzero(np.abs(values - threshold) <= tolerance * scale):
+        result[i] = exact(i)
+    return result
+
+
+class StrategyInputs():
+    '''
+        Data read by strategies, loaded once and shared by every strategy run on the same market.
+
+        Attributes:
+            store (CandleStore): candles (and linked trend ratios) of the market
+            candle_subset (CryptoCandle QuerySet): same candles in the database
+    '''
+
+    def __init__(self, store, candle_subset):
+        self.store = store
+        self.candle_subset = candle_subset
+        self.forecast_changes = {}
+
+    def arrays(self):
+        return self.store.arrays()
+
+    def forecasts(self, simulation_id):
+        '''
+            Returns dictionary of candle id: predicted change (float) of the simulation, read with one query. Candles with several forecasts are left out, same as a failed lookup of one.
+        '''
+        if simulation_id not in self.forecast_changes:
+            changes = {}
+            seen = set()
+            for candle_id, change in CryptoProphet.objects.filter(simulation_id=simulation_id,
+                                                                  crypto_candle__in=self.candle_subset
+                                                                  ).values_list('crypto_candle_id', 'change'):
+                if candle_id in seen:
+                    changes.pop(candle_id, None)
+                else:
+                    changes[candle_id] = np.nan if change is None else float(change)
+                    seen.add(candle_id)
+            self.forecast_changes[simulation_id] = changes
+        return self.forecast_changes[simulation_id]
+
+    def forget_forecasts(self, simulation_id):
+        # forecasts were replaced (ie. by Signal.predict_price)
+        self.forecast_changes.pop(simulation_id, None)
+
+
+class Strategy():
+    '''
+        Signal strategy of a Simulation. A strategy declares the data it reads and how candles are paired, the engines (Signal.loop_signals one candle at a time, VectorSignal all candles at once) do the iterating.
+
+        Attributes:
+            simulation_id (int): Simulation the strategy is registered for
+            inputs (tuple of str): data read besides candle prices: "trends" (PyTrends.trend_ratio of the candle), "forecasts" (CryptoProphet.change of the compared candle)
+            order (str): "forward" compares each candle with the prior one, "reverse" walks from the latest candle back and compares each candle with the next one
+            with_trend (bool): only candles linked to a trend are simulated
+            consecutive (bool): candles are only compared when there is no gap between them
+            incremental (bool): a signal only depends on its candle and the compared one, so update_signal can start from a date
+    '''
+
+    inputs = ()
+    order = "forward"
+    with_trend = False
+    consecutive = False
+    incremental = False
+
+    def __init__(self, simulation_id):
+        self.simulation_id = simulation_id
+
+    def prepare(self, signal, inputs):
+        '''
+            Runs before signals are calculated. Returns a message added to the one of update_signal.
+        '''
+        return ''
+
+    def calculate(self, candle, compare_candle, inputs):
+        '''
+            Returns the signal of one candle (CryptoCandle instances from CandleStore.candles).
+        '''
+        return ""
+
+    def compute(self, arrays, current, compare, inputs):
+        '''
+            Returns the signals of many candles at once: current and compare are row numbers of the candles and the candles they are compared with in the CandleStore arrays.
+        '''
+        return np.full(len(current), "", dtype=object)
+
+
+class ThresholdStrategy(Strategy):
+    '''
+        Version 1.0 of signal (based on Marc Howard's blog):
+        BUY signal:
+            1. Search terms of “Buy Bitcoin” to “BTC USD” ratio is higher than 35%.
+            2. BTC price difference closes more than $80 above the prior day’s close price.
+        SELL signal:
+            BUY signal requirements not met.
+        HOLD when the trend ratio is missing.
+
+        Attributes:
+            simulation_id (int): Simulation the strategy is registered for
+            price_diff_default (float): price difference needed for a BUY signal
+            pct (bool): price difference is a % of the prior close instead of an amount
+            trend_ratio_default (float): trend ratio needed for a BUY signal. Default = 0.35
+    '''
+
+    inputs = ("trends",)
+    with_trend = True
+    consecutive = True
+    incremental = True
+
+    def __init__(self, simulation_id, price_diff_default, pct=False, trend_ratio_default=0.35):
+        self.simulation_id = simulation_id
+        self.price_diff_default = price_diff_default
+        self.pct = pct
+        self.trend_ratio_default = trend_ratio_default
+
+    def calculate(self, candle, compare_candle, inputs):
+        price_diff = candle.period_close - compare_candle.period_close
+        if self.pct:
+            price_diff = price_diff / compare_candle.period_close
+        my_trend_ratio = candle.search_trend.trend_ratio if candle.search_trend else None
+
+        if my_trend_ratio is None:
+            calc_signal = "HOLD"
+        elif my_trend_ratio > self.trend_ratio_default and price_diff > self.price_diff_default:
+            calc_signal = "BUY"
+        else:
+            calc_signal = "SELL"
+        return calc_signal
+
+    def price_diff(self, close, compare_close):
+        if self.pct:
+            return (close - compare_close) / compare_close
+        return close - compare_close
+
+    def price_above(self, arrays, current, compare, price_diff_default):
+        '''
+            Returns whether the price difference of each candle is higher than price_diff_default.
+        '''
+        close = arrays['period_close'][current]
+        compare_close = arrays['period_close'][compare]
+
+        def exact_price(i):
+            exact_close = close_decimal(close[i])
+            exact_compare = close_decimal(compare_close[i])
+            return self.price_diff(exact_close, exact_compare) > price_diff_default
+
+        price_diff = self.price_diff(close, compare_close)
+        scale = None if self.pct else np.maximum(np.abs(close), np.abs(compare_close))
+        return exceeds(price_diff, price_diff_default, exact_price, scale)
+
+    def ratio_above(self, arrays, current, trend_ratio_default):
+        '''
+            Returns whether the trend ratio of each candle is higher than trend_ratio_default (False when missing).
+        '''
+        ratio = arrays['trend_ratio'][current]
+        return exceeds(ratio, trend_ratio_default, lambda i: ratio_decimal(ratio[i]) > trend_ratio_default)
+
+    def compute(self, arrays, current, compare, inputs):
+        price_above = self.price_above(arrays, current, compare, self.price_diff_default)
+        ratio_above = self.ratio_above(arrays, current, self.trend_ratio_default)
+
+        calc_signals = np.where(ratio_above & price_above, "BUY", "SELL").astype(object)
+        calc_signals[np.isnan(arrays['trend_ratio'][current])] = "HOLD"
+        return calc_signals
+
+
+class HindsightStrategy(Strategy):
+    '''
+        Hindsight version of signal:
+        BUY signal:
+            -- Next candle price close is higher (buy before increase).
+        SELL signal:
+            -- Next candle price close is lower (sell at peak).
+        HOLD when both closes are equal.
+    '''
+
+    order = "reverse"
+    incremental = True
+
+    def calculate(self, candle, compare_candle, inputs):
+        if candle.period_close > compare_candle.period_close:
+            calc_signal = "SELL"
+        elif candle.period_close < compare_candle.period_close:
+            calc_signal = "BUY"
+        else:
+            # Hold signal from prior day. Note: Since ideally we do not want HOLD, need to update code to copy BUY/SELL from prior day.
+            calc_signal = "HOLD"
+        return calc_signal
+
+    def compute(self, arrays, current, compare, inputs):
+        close = arrays['period_close'][current]
+        next_close = arrays['period_close'][compare]
+        scale = np.abs(next_close)
+        higher = exceeds(close, next_close, lambda i: close_decimal(close[i]) > close_decimal(next_close[i]), scale)
+        lower = exceeds(next_close, close, lambda i: close_decimal(next_close[i]) > close_decimal(close[i]), scale)
+        return np.where(higher, "SELL", np.where(lower, "BUY", "HOLD")).astype(object)
+
+
+class ProphetStrategy(Strategy):
+    '''
+        BUY/SELL when the price forecast of the next candle goes up/down, HOLD when it is flat or missing. Forecasts are recreated by Signal.predict_price first.
+
+        Attributes:
+            simulation_id (int): Simulation the strategy is registered for
+            trend_ratio_default (float): when set, candles whose trend ratio is higher give BUY regardless of the forecast. Default = None
+    '''
+
+    inputs = ("forecasts",)
+    order = "reverse"
+
+    def __init__(self, simulation_id, trend_ratio_default=None):
+        self.simulation_id = simulation_id
+        self.trend_ratio_default = trend_ratio_default
+        if trend_ratio_default is not None:
+            self.inputs = ("forecasts", "trends")
+
+    def prepare(self, signal, inputs):
+        message = ' ' + signal.predict_price()
+        inputs.forget_forecasts(self.simulation_id)
+        return message
+
+    def forecast_signal(self, change):
+        if change < 0:
+            calc_signal = "SELL"
+        elif change > 0:
+            calc_signal = "BUY"
+        else:
+            # Hold signal from prior day. Note: Since ideally we do not want HOLD, need to update code to copy BUY/SELL from prior day.
+            calc_signal = "HOLD"
+        return calc_signal
+
+    def calculate(self, candle, compare_candle, inputs):
+        change = inputs.forecasts(self.simulation_id).get(compare_candle.id, np.nan)
+        calc_signal = self.forecast_signal(change)
+        if self.trend_ratio_default is not None and candle.search_trend:
+            if candle.search_trend.trend_ratio and candle.search_trend.trend_ratio > self.trend_ratio_default:
+                calc_signal = "BUY"
+        return calc_signal
+
+    def compute(self, arrays, current, compare, inputs):
+        forecasts = inputs.forecasts(self.simulation_id)
+        change = np.array([forecasts.get(candle_id, np.nan) for candle_id in arrays['id'][compare].tolist()], dtype='float64')
+        with np.errstate(invalid='ignore'):
+            calc_signals = np.where(change < 0, "SELL", np.where(change > 0, "BUY", "HOLD")).astype(object)
+        if self.trend_ratio_default is not None:
+            ratio = arrays['trend_ratio'][current]
+            trend_above = exceeds(ratio, self.trend_ratio_default, lambda i: ratio_decimal(ratio[i]) > self.trend_ratio_default)
+            calc_signals[trend_above] = "BUY"
+        return calc_signals
+
+
+register(ThresholdStrategy(1, price_diff_default=80))
+register(HindsightStrategy(2))
+register(ThresholdStrategy(3, price_diff_default=0.01, pct=True))
+register(ProphetStrategy(4))
+# Signal #5 is almost equivalent to #4 but takes into account Google Trend ratio
+register(ProphetStrategy(5, trend_ratio_default=0.35))
@@ -0,0 +1,116 @@
+from crypto_track.signal import Signal
+from crypto_track.signal_vector import VectorSignal
+from crypto_track.strategies import ThresholdStrategy
+from crypto_track.track_exception import TrackException
+import numpy as np
+import time
+
+
+def parse_grid(text):
+    '''
+        Returns the thresholds of a grid param: comma separated values (ie. 40,80,120) or start:stop:step with stop included (ie. 0:200:5).
+    '''
+    if ':' in text:
+        start, stop, step = (float(value) for value in text.split(':'))
+        return np.arange(start, stop + step / 2, step).round(10).tolist()
+    return [float(value) for value in text.split(',') if value]
+
+
+class ThresholdSweep():
+    '''
+        Evaluates a grid of (price threshold, trend threshold) combinations of a ThresholdStrategy simulation (1 or 3) in memory: signals and bank value of every combination are computed with NumPy broadcasting over the CandleStore arrays, nothing is written to the database.
+        The bank follows BankTransaction.transaction_history: start with 1 in cash, spend it all on the first BUY, sell everything on the next SELL, HOLD keeps the prior signal. Equity is marked to the close of every simulated candle.
+
+        Attributes (align with CryptoCandle model):
+            Required:
+                currency (str): cryptocurrency being tracked
+                simulation_id (int): simulation whose strategy is swept
+                price_thresholds (list of float): price differences (amount or % as in the simulation) to try
+                trend_thresholds (list of float): trend ratios to try
+            Optional:
+                currency_quoted (str): currency used for the prices. Default = USD
+                period_interval (str): Time interval of the candle. Default 1d = 1 day (daily)
+    '''
+
+    def __init__(self,
+                 currency,
+                 simulation_id,
+                 price_thresholds,
+                 trend_thresholds,
+                 currency_quoted="USD",
+                 period_interval="1d"
+                 ):
+
+        self.currency = currency
+        self.simulation_id = simulation_id
+        self.price_thresholds = price_thresholds
+        self.trend_thresholds = trend_thresholds
+        self.signal = Signal(currency=currency,
+                             simulation_id=simulation_id,
+                             currency_quoted=currency_quoted,
+                             period_interval=period_interval)
+        if not isinstance(self.signal.strategy, ThresholdStrategy):
+            raise TrackException(f"Simulation {simulation_id} does not use price and trend thresholds.", "Bad Request")
+        if not price_thresholds or not trend_thresholds:
+            raise TrackException("Please specify at least one price and one trend threshold.", "Bad Request")
+
+    def run(self, top=10):
+        '''
+            Return value:
+            Dictionary with number of combinations and simulated candles, seconds spent and the top combinations by final equity (price_threshold, trend_threshold, final_equity, max_drawdown (fraction of the peak lost), trades).
+        '''
+        started = time.monotonic()
+        strategy = self.signal.strategy
+        self.signal.store.refresh()
+        engine = VectorSignal(self.signal)
+        arrays = engine.arrays
+        first, current, compare = engine.pairs()
+        if not len(current):
+            raise TrackException(f"There are no candles to simulate for {self.currency}.", "Not Found")
+
+        # HOLD (no trend ratio) repeats the last BUY/SELL, SELL before any: index of the last candle with a ratio.
+        valid = ~np.isnan(arrays['trend_ratio'][current])
+        last_valid = np.maximum.accumulate(np.where(valid, np.arange(len(current)), -1))
+        before_any = last_valid < 0
+        last_valid = np.maximum(last_valid, 0)
+
+        # growth of one unit of crypto from the prior simulated candle
+        closes = arrays['period_close'][np.r_[first, current]]
+        growth = closes[1:] / closes[:-1]
+
+        trend_above = np.array([strategy.ratio_above(arrays, current, trend) for trend in self.trend_thresholds])
+        results = []
+        for price in self.price_thresholds:
+            price_above = strategy.price_above(arrays, current, compare, price)
+            # (trend thresholds, candles): holding crypto after each candle
+            holding = (trend_above & price_above)[:, last_valid]
+            holding[:, before_any] = False
+            holding_before = np.concatenate([np.zeros((len(holding), 1), dtype=bool), holding[:, :-1]], axis=1)
+
+            equity = np.cumprod(np.where(holding_before, growth, 1.0), axis=1)
+            peak = np.maximum(np.maximum.accumulate(equity, axis=1), 1.0)
+            max_drawdown = (1 - equity / peak).max(axis=1)
+            trades = (holding != holding_before).sum(axis=1)
+
+            for trend, final_equity, drawdown, trade_count in zip(self.trend_thresholds, equity[:, -1], max_drawdown, trades):
+                results.append({"price_threshold": price,
+                                "trend_threshold": trend,
+                                "final_equity": float(final_equity),
+                                "max_drawdown": float(drawdown),
+                                "trades": int(trade_count)})
+
+        results.sort(key=lambda result: (-result['final_equity'], result['max_drawdown']))
+        return {"combinations": len(results),
+                "candles": len(current) + 1,
+                "seconds": round(time.monotonic() - started, 3),
+                "results": results[:top]}
+
+    def save(self, price_threshold, trend_threshold):
+        '''
+            Writes the signals and bank history of one combination (until the simulation is updated again with its registered thresholds).
+        '''
+        self.signal.strategy = ThresholdStrategy(self.simulation_id,
+                                                 price_diff_default=price_threshold,
+                                                 pct=self.signal.strategy.pct,
+                                                 trend_ratio_default=trend_threshold)
+        return self.signal.update_signal()
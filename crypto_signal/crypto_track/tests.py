@@ -1,3 +1,755 @@
-from django.test import TestCase
+from django.test import RequestFactory, TestCase, override_settings
+from crypto_track.models import CryptoCandle, PyTrends, Simulation, SignalSimulation, SignalLookup, LatestSignal, SignalVersion, Bank
+from crypto_track.transaction import BankTransaction
+from crypto_track.candle_store import CandleStore
+from crypto_track.candle_writer import CandleWriter
+from crypto_track.signal import Signal
+from crypto_track.signal_range import SignalRange
+from crypto_track.sweep import ThresholdSweep
+from django.contrib.auth.models import User
+from crypto_track.crypto_data import CryptoData
+from crypto_track.json_stream import iter_json_array
+from crypto_track.batch_loader import NomicsBatchLoader, RateLimiter
+from crypto_track.response_cache import ResponseCache, response_cache
+from crypto_track.exchange_loader import ExchangeLoader, build_jobs
+from crypto_track.trends import CryptoTrends
+from crypto_track import views
+from crypto_track import db_router
+from crypto_track.db_router import publishes_snapshot, publish_snapshot
+from django.conf import settings
+from django.core.cache import caches
+from django.http import JsonResponse
+from unittest import mock
+from http.server import BaseHTTPRequestHandler, HTTPServer
+import datetime
+import decimal
+import json
+import multiprocessing
+import os
+import pandas as pd
+import random
+import shutil
+import sqlite3
+import tempfile
+import threading
+import time
+import urllib.parse
 
-# Create your tests here.
+
+class LocalServer():
+    '''
+        HTTP server on a free local port that answers every GET from a dictionary of path: (status, body bytes), so loaders can be tested offline. A route can also be a function of the full request path returning (status, body bytes).
+    '''
+
+    def __init__(self, routes):
+        self.routes = routes
+        self.requests = []
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                server.requests.append(self.path)
+                route = server.routes.get(self.path.split('?')[0], (404, b'{"error": "not found"}'))
+                status, body = route(self.path) if callable(route) else route
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = HTTPServer(('127.0.0.1', 0), Handler)
+        self.url = f"http://127.0.0.1:{self.httpd.server_port}"
+
+    def __enter__(self):
+        threading.Thread(target=self.httpd.serve_forever, daemon=True).start()
+        return self
+
+    def __exit__(self, *args):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+def nomics_records(count, start=datetime.datetime(2015, 1, 1)):
+    # count daily candles as returned by the Nomics candles endpoint
+    records = []
+    for day in range(count):
+        timestamp = (start + datetime.timedelta(days=day)).strftime('%Y-%m-%dT%H:%M:%SZ')
+        close = f"{1000 + day}.{day % 97:02d}"
+        records.append({"timestamp": timestamp, "open": "1000.5", "high": "2000.25", "low": "900.125",
+                        "close": close, "volume": "12345678.125"})
+    return records
+
+
+class StoreTestCase(TestCase):
+    # candle stores (and the response cache) of a test live in a temporary directory
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.settings_override = override_settings(CANDLE_STORE_DIR=os.path.join(self.directory, 'store'),
+                                                   RESPONSE_CACHE_DIR=None)
+        self.settings_override.enable()
+
+    def tearDown(self):
+        self.settings_override.disable()
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+class ResponseCacheTests(TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+    def test_follows_settings(self):
+        with override_settings(RESPONSE_CACHE_DIR=self.directory):
+            response_cache.set('test', 'endpoint', {'a': 1}, [1, 2])
+            self.assertEqual(response_cache.get('test', 'endpoint', {'a': 1}), [1, 2])
+        self.assertTrue(os.listdir(self.directory))
+        with override_settings(RESPONSE_CACHE_DIR=None):
+            self.assertIsNone(response_cache.get('test', 'endpoint', {'a': 1}))
+
+    def test_walks_only_over_limit(self):
+        cache = ResponseCache(directory=self.directory)
+        cache.set('test', 'endpoint', {'page': 0}, [0])
+        size = cache.sizes[self.directory]
+        cache._max_bytes = size * 3 + size // 2
+        os.utime(cache.path('test', 'endpoint', {'page': 0}), (1, 1))
+
+        with mock.patch.object(cache, 'entries', wraps=cache.entries) as entries:
+            for page in [1, 2]:
+                cache.set('test', 'endpoint', {'page': page}, [page])
+            # replacing an entry keeps the total
+            cache.set('test', 'endpoint', {'page': 1}, [1])
+            self.assertEqual(entries.call_count, 0)
+            self.assertEqual(cache.sizes[self.directory], size * 3)
+
+            cache.set('test', 'endpoint', {'page': 3}, [3])
+            self.assertEqual(entries.call_count, 1)
+        # the least recently used entry made room
+        self.assertIsNone(cache.get('test', 'endpoint', {'page': 0}))
+        self.assertEqual([cache.get('test', 'endpoint', {'page': page}) for page in [1, 2, 3]], [[1], [2], [3]])
+        self.assertEqual(cache.sizes[self.directory], size * 3)
+
+
+class JsonStreamTests(TestCase):
+
+    def test_every_chunk_boundary(self):
+        payload = '[{"a": "ü€", "b": [1, 2.5e3, null]}, -12.75, "x,]y", true, {"nested": {"c": "\\u00e9"}}]'
+        expected = json.loads(payload)
+        data = payload.encode('utf-8')
+        for split in range(1, len(data)):
+            self.assertEqual(list(iter_json_array([data[:split], data[split:]])), expected, f"split at byte {split}")
+        # one byte at a time (multi-byte characters and numbers cut in half)
+        self.assertEqual(list(iter_json_array(data[i:i + 1] for i in range(len(data)))), expected)
+
+    def test_empty_array(self):
+        self.assertEqual(list(iter_json_array([b' [ ', b' ] \n'])), [])
+
+    def test_malformed_input(self):
+        for payload in [b'{"error": "rate limited"}', b'[1, 2', b'[1 2]', b'[1, 2] 3', b'[{"a": }]', b'', b'[1,, 2]']:
+            with self.assertRaises(ValueError, msg=payload):
+                list(iter_json_array([payload[:3], payload[3:]]))
+
+
+class NomicsStreamTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.environ.setdefault("NOMICS_API_KEY", "test")
+
+    def load(self, server, **options):
+        loader = CryptoData("BTC", options={"stream": "true", **options})
+        loader.nomics_url = f"{server.url}/candles"
+        loader.stream_chunk_size = 500
+        return json.loads(loader.get_nomics().content)
+
+    def test_large_payload(self):
+        records = nomics_records(5000)
+        with LocalServer({'/candles': (200, json.dumps(records).encode())}) as server:
+            response = self.load(server)
+        self.assertEqual(response['status_code'], 202, response)
+        candles = CryptoCandle.objects.filter(crypto_traded="BTC").order_by('period_start')
+        self.assertEqual(candles.count(), 5000)
+        self.assertEqual(candles.last().period_close, decimal.Decimal(records[-1]['close']))
+        self.assertEqual(candles.first().period_volume, decimal.Decimal("12345678.125"))
+
+        # loading again updates in place
+        with LocalServer({'/candles': (200, json.dumps(records[-10:]).encode())}) as server:
+            response = self.load(server)
+        self.assertIn("Inserted 0 and updated 10", response['message'])
+        self.assertEqual(CryptoCandle.objects.count(), 5000)
+
+    def test_truncated_payload(self):
+        body = json.dumps(nomics_records(1200)).encode()
+        with LocalServer({'/candles': (200, body[:-200])}) as server:
+            response = self.load(server)
+        self.assertEqual(response['status_code'], 409)
+        # every complete chunk before the error was written
+        self.assertIn("inserted 1000", response['message'])
+        self.assertEqual(CryptoCandle.objects.count(), 1000)
+
+    def test_error_status(self):
+        with LocalServer({'/candles': (429, b'{"error": "rate limited"}')}) as server:
+            response = self.load(server)
+        self.assertEqual(response['status_code'], 409)
+        self.assertEqual(CryptoCandle.objects.count(), 0)
+
+
+class BatchLoaderTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        os.environ.setdefault("NOMICS_API_KEY", "test")
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def answer(self, path):
+        # BTC is rate limited on its first request, XRP is unknown upstream
+        currency = urllib.parse.parse_qs(urllib.parse.urlsplit(path).query)['currency'][0]
+        with self.lock:
+            self.calls[currency] = self.calls.get(currency, 0) + 1
+            calls = self.calls[currency]
+        if currency == "XRP":
+            return 404, b'{"error": "unknown currency"}'
+        if currency == "BTC" and calls == 1:
+            return 429, b'{"error": "rate limited"}'
+        return 200, json.dumps(nomics_records(30 if currency == "BTC" else 20)).encode()
+
+    def test_load_currencies(self):
+        loader = NomicsBatchLoader(["BTC", "ETH", "XRP"], max_workers=3, calls_per_second=0, retries=2, backoff_factor=0)
+        with LocalServer({'/candles': self.answer}) as server, mock.patch.object(CryptoData, 'nomics_url', f"{server.url}/candles"):
+            results = loader.load()
+
+        self.assertEqual((results["BTC"]["status"], results["BTC"]["inserted"]), ("Accepted", 30))
+        self.assertEqual((results["ETH"]["status"], results["ETH"]["inserted"]), ("Accepted", 20))
+        self.assertEqual((results["XRP"]["status"], results["XRP"]["type"]), ("Conflict", "HTTPError"))
+        self.assertEqual(self.calls["BTC"], 2)
+        self.assertEqual(CryptoCandle.objects.filter(crypto_traded="BTC").count(), 30)
+        self.assertEqual(CryptoCandle.objects.filter(crypto_traded="ETH").count(), 20)
+        self.assertFalse(CryptoCandle.objects.filter(crypto_traded="XRP").exists())
+
+    def test_rate_limiter_spacing(self):
+        started = time.monotonic()
+        rate_limiter = RateLimiter(20)
+        times = []
+
+        def call():
+            for _ in range(3):
+                rate_limiter.wait()
+                with self.lock:
+                    times.append(time.monotonic())
+
+        threads = [threading.Thread(target=call) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(times), 12)
+        # 1/20 s between calls whichever thread makes them: the n-th call can not return before n/20 s
+        for calls, returned in enumerate(sorted(times)):
+            self.assertGreaterEqual(returned - started, calls * 0.05 - 1e-6)
+
+
+class ExchangeLoaderTests(StoreTestCase):
+    # kraken answers OHLC requests with [time (s), open, high, low, close, vwap, volume, count] rows under the pair id
+    markets = {'BTC/USD': {'id': 'XXBTZUSD', 'symbol': 'BTC/USD', 'base': 'BTC', 'quote': 'USD', 'baseId': 'XXBT', 'quoteId': 'ZUSD',
+                           'active': True, 'spot': True, 'type': 'spot', 'precision': {'price': 1, 'amount': 8}, 'limits': {}}}
+
+    def ohlc(self, days):
+        start = int(datetime.datetime(2019, 1, 1, tzinfo=datetime.timezone.utc).timestamp())
+        rows = [[start + day * 86400, "3700.0", "3800.5", "3600.25", f"{3750 + day}.5", "3720.1", "1500.125", 42] for day in range(days)]
+        return json.dumps({"error": [], "result": {"XXBTZUSD": rows, "last": rows[-1][0]}}).encode()
+
+    def load(self, server):
+        loader = ExchangeLoader(build_jobs(['kraken'], ['BTC/USD'], ['1d']),
+                                since="2019-01-01",
+                                exchange_config={'kraken': {'urls': {'api': {'public': server.url}},
+                                                            'markets': self.markets,
+                                                            'enableRateLimit': False}})
+        return loader.load()
+
+    def test_fake_exchange(self):
+        with LocalServer({'/0/public/OHLC': (200, self.ohlc(10))}) as server:
+            stats = self.load(server)
+        self.assertEqual(stats['results']['kraken:BTC/USD:1d'], {"status": "Accepted", "inserted": 10, "updated": 0})
+        candles = CryptoCandle.objects.filter(crypto_traded="BTC", currency_quoted="USD", data_source="CCXT kraken").order_by('period_start')
+        self.assertEqual(candles.count(), 10)
+        self.assertEqual(candles.first().period_start_timestamp, "2019-01-01T00:00:00Z")
+        self.assertEqual(candles.last().period_close, decimal.Decimal("3759.5"))
+        self.assertEqual(candles.last().period_volume, decimal.Decimal("1500.125"))
+
+        # the next load starts from the latest stored candle
+        with LocalServer({'/0/public/OHLC': (200, self.ohlc(12))}) as server:
+            stats = self.load(server)
+        self.assertEqual(stats['results']['kraken:BTC/USD:1d'], {"status": "Accepted", "inserted": 2, "updated": 1})
+        self.assertEqual(candles.count(), 12)
+
+    def test_exchange_error(self):
+        with LocalServer({'/0/public/OHLC': (200, b'{"error": ["EGeneral:Internal error"]}')}) as server:
+            stats = self.load(server)
+        self.assertEqual(stats['results']['kraken:BTC/USD:1d']['status'], "Conflict")
+        self.assertEqual(CryptoCandle.objects.count(), 0)
+
+    def test_unknown_exchange(self):
+        stats = ExchangeLoader(build_jobs(['not_an_exchange'], ['BTC/USD'], ['1d'])).load()
+        self.assertEqual(stats['results']['not_an_exchange:BTC/USD:1d']['status'], "Conflict")
+
+
+class StubTrendReq():
+    # stands in for pytrends.request.TrendReq: answers interest_over_time for the requested timeframe without network access
+    created = []
+    lock = threading.Lock()
+
+    def __init__(self, hl=None):
+        with self.lock:
+            self.created.append(self)
+
+    def build_payload(self, kw_list, cat=0, timeframe='', geo='', gprop=''):
+        self.kw_list = kw_list
+        self.timeframe = timeframe
+
+    def interest_over_time(self):
+        start, end = self.timeframe.split(' ')
+        dates = pd.date_range(start, end, freq='D')
+        return pd.DataFrame({self.kw_list[0]: [day.day for day in dates],
+                             self.kw_list[1]: [day.day % 4 * 10 for day in dates],
+                             'isPartial': [False] * len(dates)},
+                            index=dates)
+
+
+class TrendsTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        StubTrendReq.created = []
+        self.request_class = CryptoTrends.request_class
+        CryptoTrends.request_class = StubTrendReq
+
+    def tearDown(self):
+        CryptoTrends.request_class = self.request_class
+        super().tearDown()
+
+    def test_load_periods(self):
+        my_trend = CryptoTrends('buy bitcoin', 'BTC USD', max_workers=3)
+        periods = my_trend.trend_periods(datetime.date(2018, 12, 31), first_date=datetime.date(2017, 1, 1))
+        self.assertEqual(my_trend.load_periods(periods), 730)
+
+        self.assertEqual(PyTrends.objects.count(), 730)
+        # one client per worker thread (the response cache is off, so every period reaches the stub)
+        self.assertIn(len(StubTrendReq.created), [1, 2, 3])
+        trend = PyTrends.objects.get(date=datetime.date(2018, 3, 10))
+        self.assertEqual((trend.buy_bitcoin, trend.btc_usd), (10, 20))
+        self.assertEqual(trend.trend_ratio, decimal.Decimal("0.5"))
+        # btc_usd = 0 leaves the ratio empty
+        self.assertIsNone(PyTrends.objects.get(date=datetime.date(2018, 3, 8)).trend_ratio)
+
+        # loading again keeps every date
+        self.assertEqual(my_trend.load_periods(periods[:1]), 181)
+        self.assertEqual(PyTrends.objects.count(), 730)
+
+    def test_bad_workers(self):
+        # undecorated view, nothing is published from a test
+        request = RequestFactory().post('/load/trends?workers=abc')
+        response = json.loads(views.load_trends.__wrapped__(request).content)
+        self.assertEqual(response['status_code'], 409)
+        self.assertEqual(response['type'], "ValueError")
+
+
+class BankTests(TestCase):
+
+    def setUp(self):
+        self.simulation = Simulation.objects.create(id=2, name="Hindsight", description="test")
+        self.trader = User.objects.create(username="admin")
+        self.sims = []
+        for day, close in enumerate(["3980.93", "9.5", "10.25"]):
+            candle = CryptoCandle.objects.create(crypto_traded="BTC", currency_quoted="USD", period_interval="1d",
+                                                 period_start_timestamp=f"2019-02-{day + 20}T00:00:00Z",
+                                                 period_low=0, period_open=0, period_close=decimal.Decimal(close), period_high=0, period_volume=0,
+                                                 data_source="Nomics")
+            self.sims.append(SignalSimulation.objects.create(crypto_candle=candle, simulation=self.simulation, signal="BUY"))
+
+    def test_exact_balances(self):
+        values = [decimal.Decimal('32.03077383020484671804101338'), decimal.Decimal('3076821087918705.269778770501'),
+                  decimal.Decimal('0.000000000000000000001451685517'), decimal.Decimal('0E-11')]
+        for value in values:
+            bank = Bank.objects.create(signal_simulation=self.sims[0], user=self.trader, cash_bank=value, crypto_bank=value)
+            bank.refresh_from_db()
+            self.assertEqual(str(bank.cash_bank), str(value))
+            self.assertEqual(str(bank.crypto_bank), str(value))
+
+    def test_equity_summary(self):
+        # equity 100 (cash), then 9 and 10.25 (crypto at the close): numeric and text order differ
+        balances = [(0, 100), (decimal.Decimal('0.9473684210526315789473684211'), 0), (1, 0)]
+        for sim, (crypto, cash) in zip(self.sims, balances):
+            Bank.objects.create(signal_simulation=sim, user=self.trader, crypto_bank=crypto, cash_bank=cash)
+
+        # another interval of the same currency is summarized on its own
+        candle = CryptoCandle.objects.create(crypto_traded="BTC", currency_quoted="USD", period_interval="4h",
+                                             period_start_timestamp="2019-02-20T04:00:00Z",
+                                             period_low=0, period_open=0, period_close=1000, period_high=0, period_volume=0,
+                                             data_source="Nomics")
+        sim = SignalSimulation.objects.create(crypto_candle=candle, simulation=self.simulation, signal="BUY")
+        Bank.objects.create(signal_simulation=sim, user=self.trader, crypto_bank=1, cash_bank=0)
+
+        daily = CryptoCandle.objects.filter(period_interval="1d")
+        summary = BankTransaction(daily, self.simulation, "BTC").equity_summary()
+        expected = [decimal.Decimal(100), balances[1][0] * decimal.Decimal('9.5'), decimal.Decimal('10.25')]
+        self.assertEqual(summary['transactions'], 3)
+        self.assertEqual(summary['max_equity'], max(expected))
+        self.assertEqual(summary['min_equity'], min(expected))
+        self.assertEqual(summary['starting_equity'], expected[0])
+        self.assertEqual(summary['final_equity'], expected[-1])
+        self.assertEqual(summary['pnl'], decimal.Decimal('-89.75'))
+
+        four_hours = BankTransaction(CryptoCandle.objects.filter(period_interval="4h"), self.simulation, "BTC").equity_summary()
+        self.assertEqual((four_hours['transactions'], four_hours['final_equity']), (1, decimal.Decimal(1000)))
+
+    def test_bank_view_per_interval(self):
+        sim = self.sims[0]
+        Bank.objects.create(signal_simulation=sim, user=self.trader, crypto_bank=0, cash_bank=1)
+        for query, transactions in [("", 1), ("&interval=1d&quote=USD", 1)]:
+            response = json.loads(views.bank(RequestFactory().get(f"/2/bank?currency=BTC{query}"), 2).content)
+            self.assertEqual(response['transactions'], transactions)
+        response = json.loads(views.bank(RequestFactory().get("/2/bank?currency=BTC&interval=4h"), 2).content)
+        self.assertEqual(response['status_code'], 409)
+
+
+def hold_store(store, held, seconds):
+    # runs in another process
+    with store.locked():
+        held.set()
+        time.sleep(seconds)
+
+
+class CandleStoreTests(StoreTestCase):
+
+    def test_refresh_waits_for_other_process(self):
+        store = CandleStore("BTC")
+        # forked so the child does not need its own Django setup
+        context = multiprocessing.get_context('fork')
+        held = context.Event()
+        holder = context.Process(target=hold_store, args=(store, held, 1))
+        holder.start()
+        try:
+            self.assertTrue(held.wait(10))
+            started = time.monotonic()
+            store.refresh()
+            self.assertGreaterEqual(time.monotonic() - started, 0.5)
+        finally:
+            holder.join()
+        self.assertEqual(holder.exitcode, 0)
+
+
+def hourly_records(count, start=datetime.datetime(2019, 1, 1)):
+    # count hourly candles, close = the hour number
+    return [{"timestamp": (start + datetime.timedelta(hours=hour)).strftime('%Y-%m-%dT%H:%M:%SZ'),
+             "open": "1", "high": "2", "low": "0.5", "close": str(hour), "volume": "10"}
+            for hour in range(count)]
+
+
+@override_settings(ROLLUP_INTERVALS={'1h': ['4h', '1d']})
+class RollupTests(StoreTestCase):
+
+    def write(self, records, period_interval):
+        writer = CandleWriter("BTC", "Nomics test", period_interval=period_interval)
+        return writer.write([writer.build_candle(record) for record in records])
+
+    def candles(self, period_interval):
+        return list(CryptoCandle.objects.filter(period_interval=period_interval, source="nomics-test")
+                    .order_by('period_start').values_list('period_start_timestamp', 'period_close', 'period_volume', 'data_source'))
+
+    def test_keeps_loaded_candles_and_skips_partial_buckets(self):
+        self.write([{"timestamp": "2019-01-01T00:00:00Z", "open": "1", "high": "2", "low": "0.5", "close": "99", "volume": "7"}], '1d')
+        self.write(hourly_records(27), '1h')
+
+        self.assertEqual(self.candles('1d'), [("2019-01-01T00:00:00Z", decimal.Decimal(99), decimal.Decimal(7), "Nomics test")])
+        # 2019-01-02 00:00 (4h) only has 3 of its 4 hours
+        four_hours = self.candles('4h')
+        self.assertEqual([candle[0][11:13] for candle in four_hours], ["00", "04", "08", "12", "16", "20"])
+        self.assertEqual(four_hours[1][1:], (decimal.Decimal(7), decimal.Decimal(40), "Rollup 1h Nomics test"))
+
+        self.write(hourly_records(21, start=datetime.datetime(2019, 1, 2, 3)), '1h')
+        self.assertEqual(self.candles('1d')[1], ("2019-01-02T00:00:00Z", decimal.Decimal(20), decimal.Decimal(240), "Rollup 1h Nomics test"))
+        self.assertEqual(len(self.candles('4h')), 12)
+
+        # loading the interval directly replaces the rollup
+        self.write([{"timestamp": "2019-01-02T00:00:00Z", "open": "1", "high": "2", "low": "0.5", "close": "98", "volume": "7"}], '1d')
+        self.assertEqual(self.candles('1d')[1], ("2019-01-02T00:00:00Z", decimal.Decimal(98), decimal.Decimal(7), "Nomics test"))
+        self.assertEqual(CryptoCandle.objects.filter(period_interval='1d').count(), 2)
+
+
+class SignalTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        Simulation.objects.create(id=2, name="Hindsight", description="test")
+        for period_interval in ['1d', '4h']:
+            writer = CandleWriter("BTC", "Nomics", period_interval=period_interval)
+            writer.write([writer.build_candle(record) for record in nomics_records(5)])
+
+    def test_update_keeps_other_intervals(self):
+        Signal("BTC", 2).update_signal()
+        daily = SignalSimulation.objects.filter(crypto_candle__period_interval='1d')
+        banks = list(Bank.objects.filter(signal_simulation__in=daily).values_list('id', flat=True))
+        self.assertEqual(daily.count(), 5)
+        self.assertTrue(banks)
+        Signal("BTC", 2, period_interval='4h').update_signal()
+        self.assertEqual(daily.count(), 5)
+        self.assertEqual(list(Bank.objects.filter(signal_simulation__in=daily).values_list('id', flat=True)), banks)
+        self.assertEqual(SignalSimulation.objects.filter(crypto_candle__period_interval='4h').count(), 5)
+
+    def test_lookup_follows_ingest(self):
+        my_signal = Signal("BTC", 2)
+        my_signal.update_signal()
+        self.assertEqual(my_signal.get_signal("2015-01-04")['period_close'], decimal.Decimal('1003.03'))
+
+        writer = CandleWriter("BTC", "Nomics")
+        record = dict(nomics_records(4)[3], close="1500.5")
+        writer.write([writer.build_candle(record)])
+        self.assertEqual(my_signal.get_signal("2015-01-04")['period_close'], decimal.Decimal('1500.5'))
+        # dates before the written candle keep their rows, unless they compare against it (hindsight compares the next candle)
+        self.assertEqual(sorted(str(row.date) for row in SignalLookup.objects.all()), ["2015-01-01", "2015-01-02"])
+
+    def test_latest_follows_ingest(self):
+        my_signal = Signal("BTC", 2)
+        my_signal.update_signal()
+        latest = my_signal.get_signal("")
+        self.assertTrue(LatestSignal.objects.filter(pk=my_signal.latest_key()).exists())
+
+        # the latest signal (2015-01-04) compares against the next candle
+        writer = CandleWriter("BTC", "Nomics")
+        writer.write([writer.build_candle(dict(nomics_records(5)[4], close="1500.5"))])
+        self.assertFalse(LatestSignal.objects.exists())
+        self.assertEqual(my_signal.get_signal(""), dict(latest, comparison_period_close=decimal.Decimal('1500.5')))
+
+        # trend links change the trend ratio of any date
+        my_signal.update_signal()
+        CryptoData("BTC").link_trends()
+        self.assertFalse(LatestSignal.objects.exists())
+        self.assertFalse(SignalLookup.objects.exists())
+
+
+    def test_etag_per_query(self):
+        Signal("BTC", 2).update_signal()
+        etag = views.signal(RequestFactory().get("/2/signal?currency=BTC&date=2015-01-03"), 2)['ETag']
+        for query, status in [("&date=2015-01-03", 304), ("&date=2015-01-03&interval=1d&quote=USD", 304),
+                              ("&date=2015-01-04", 200), ("&date=2015-01-03&interval=4h", 200), ("&date=2015-01-03&quote=EUR", 200)]:
+            response = views.signal(RequestFactory().get(f"/2/signal?currency=BTC{query}", HTTP_IF_NONE_MATCH=etag), 2)
+            self.assertEqual(response.status_code, status, query)
+
+    def test_deleted_simulation_drops_read_rows(self):
+        Signal("BTC", 2).update_signal()
+        version = SignalVersion.current(2, "BTC")
+        self.assertTrue(SignalLookup.objects.exists())
+        self.assertTrue(LatestSignal.objects.exists())
+
+        # load_simulations deletes every Simulation before loading them again
+        Simulation.objects.all().delete()
+        self.assertFalse(SignalLookup.objects.exists())
+        self.assertFalse(LatestSignal.objects.exists())
+        self.assertGreater(SignalVersion.current(2, "BTC"), version)
+
+    def test_range_reads_candles_without_lookup_rows(self):
+        for simulation_id in [1, 3]:
+            Simulation.objects.create(id=simulation_id, name=f"Sim {simulation_id}", description="test")
+        for simulation_id in [1, 2]:
+            Signal("BTC", simulation_id).update_signal()
+        my_range = SignalRange(["BTC"], datetime.date(2015, 1, 2), datetime.date(2015, 1, 31))
+        expected = list(my_range.rows())
+        self.assertEqual([row[:2] for row in expected], [(1, "BTC")] * 4 + [(2, "BTC")] * 4 + [(3, "BTC")] * 4)
+
+        # simulation 3 never built lookup rows, the others lose them from 2015-01-04 on
+        SignalLookup.invalidate("BTC", since=datetime.datetime(2015, 1, 4, tzinfo=datetime.timezone.utc))
+        self.assertEqual(list(my_range.rows()), expected)
+
+        writer = CandleWriter("BTC", "Nomics")
+        writer.write([writer.build_candle(dict(nomics_records(5)[4], close="1500.5"))])
+        self.assertEqual([row[5] for row in my_range.rows() if row[0] == 2], [decimal.Decimal(close) for close in ["1001.01", "1002.02", "1003.03", "1500.5"]])
+
+
+    def test_signal_view_per_quote(self):
+        caches[settings.SIGNAL_CACHE_ALIAS].clear()
+        writer = CandleWriter("BTC", "Nomics", currency_quoted="EUR")
+        writer.write([writer.build_candle(dict(record, close="900.5")) for record in nomics_records(5)])
+        for currency_quoted in ["USD", "EUR"]:
+            Signal("BTC", 2, currency_quoted=currency_quoted).update_signal()
+
+        closes = {}
+        for query in ["", "&quote=USD", "&quote=EUR"]:
+            response = views.signal(RequestFactory().get(f"/2/signal?currency=BTC&date=2015-01-03{query}"), 2)
+            message = json.loads(response.content)
+            closes[query] = (message['currency_quoted'], decimal.Decimal(message['period_close']))
+        usd = ("USD", decimal.Decimal("1002.02"))
+        self.assertEqual(closes, {"": usd, "&quote=USD": usd, "&quote=EUR": ("EUR", decimal.Decimal("900.5"))})
+
+
+class SignalEngineTests(StoreTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for simulation_id in [1, 2, 3]:
+            Simulation.objects.create(id=simulation_id, name=f"Sim {simulation_id}", description="test")
+        generator = random.Random(7)
+        start = datetime.date(2019, 1, 1)
+        # trend ratios around the 0.35 threshold, some missing (HOLD) and some dates without trends at all
+        PyTrends.objects.bulk_create([PyTrends(date=start + datetime.timedelta(days=day),
+                                               trend_ratio=None if day % 11 == 5 else decimal.Decimal(generator.randint(20000, 50000)) / 100000)
+                                      for day in range(60) if day % 17 != 8])
+        close = 3500
+        self.records = []
+        for day in range(60):
+            close += generator.randint(-300, 300) + generator.randint(0, 99) / 100
+            self.records.append({"timestamp": f"{start + datetime.timedelta(days=day)}T00:00:00Z",
+                                 "open": "1", "high": "2", "low": "0.5", "close": f"{close:.2f}", "volume": "10"})
+
+        # candles exactly at a threshold: +80 (simulation 1), trend ratio 0.35, +1% (simulation 3) and an unchanged close (simulation 2)
+        for day, close, trend_ratio in [(9, "4000.00", None), (10, "4080.00", "0.5"), (11, "3000.00", None), (12, "3500.00", "0.35"),
+                                        (19, "4000.00", None), (20, "4040.00", "0.5"), (30, self.records[29]['close'], None)]:
+            self.records[day]['close'] = close
+            if trend_ratio:
+                PyTrends.objects.filter(date=start + datetime.timedelta(days=day)).update(trend_ratio=decimal.Decimal(trend_ratio))
+
+    def write(self, records):
+        writer = CandleWriter("BTC", "Nomics")
+        writer.write([writer.build_candle(record) for record in records])
+
+    def results(self, simulation_id):
+        signals = sorted(SignalSimulation.objects.filter(simulation_id=simulation_id).values_list('crypto_candle_id', 'candle_compare_id', 'signal'))
+        banks = sorted((candle_id, str(crypto_bank), str(cash_bank)) for candle_id, crypto_bank, cash_bank in Bank.objects.filter(
+            signal_simulation__simulation_id=simulation_id).values_list('signal_simulation__crypto_candle_id', 'crypto_bank', 'cash_bank'))
+        return signals, banks
+
+    def test_loop_equals_vector(self):
+        self.write(self.records)
+        for simulation_id in [1, 2, 3]:
+            Signal("BTC", simulation_id).update_signal(engine="loop")
+            loop = self.results(simulation_id)
+            Signal("BTC", simulation_id).update_signal(engine="vector")
+            self.assertEqual(self.results(simulation_id), loop, f"simulation {simulation_id}")
+            self.assertTrue(loop[1])
+
+        signals = {(simulation_id, candle_date): signal for simulation_id, candle_date, signal in SignalSimulation.objects.values_list(
+            'simulation_id', 'crypto_candle__period_date', 'signal')}
+        day = datetime.date(2019, 1, 1)
+        # price differences equal to the threshold are not above it
+        self.assertEqual(signals[(1, day + datetime.timedelta(days=10))], "SELL")
+        self.assertEqual(signals[(3, day + datetime.timedelta(days=20))], "SELL")
+        # the stored ratio 0.35000 is compared exactly with the float default 0.35 (slightly below it)
+        self.assertEqual(signals[(1, day + datetime.timedelta(days=12))], "BUY")
+        # candles without a trend are left out of the trend simulations
+        self.assertNotIn((1, day + datetime.timedelta(days=8)), signals)
+
+    def test_sweep_matches_bank(self):
+        self.write(self.records)
+        for simulation_id, price_threshold in [(1, 80), (3, 0.01)]:
+            result = ThresholdSweep("BTC", simulation_id, [price_threshold], [0.35]).run()['results'][0]
+            my_signal = Signal("BTC", simulation_id)
+            my_signal.update_signal()
+            summary = BankTransaction(my_signal.candle_subset, my_signal.simulation_obj, "BTC").equity_summary()
+            self.assertEqual(summary['starting_equity'], 1)
+            self.assertAlmostEqual(result['final_equity'], float(summary['final_equity']), delta=1e-12 * result['final_equity'])
+            # the first bank only holds the starting cash
+            self.assertEqual(result['trades'], summary['transactions'] - 1)
+            self.assertGreater(result['trades'], 2)
+
+    def test_sweep_view(self):
+        self.write(self.records)
+        Signal("BTC", 1).update_signal()
+        stored = self.results(1)
+        query = "currency=BTC&price=0:200:40&trend=0.3,0.35,0.4&top=3"
+
+        response = json.loads(views.sweep.__wrapped__(RequestFactory().get(f"/1/sweep?{query}"), 1).content)
+        self.assertEqual((response['status_code'], len(response['results'])), (200, 3))
+        self.assertEqual(self.results(1), stored)
+
+        response = json.loads(views.sweep.__wrapped__(RequestFactory().patch(f"/1/sweep?{query}&save=true"), 1).content)
+        best = response['results'][0]
+        self.assertNotEqual(self.results(1), stored)
+        my_signal = Signal("BTC", 1)
+        summary = BankTransaction(my_signal.candle_subset, my_signal.simulation_obj, "BTC").equity_summary()
+        self.assertAlmostEqual(best['final_equity'], float(summary['final_equity']), delta=1e-12 * best['final_equity'])
+        self.assertEqual(best['trades'], summary['transactions'] - 1)
+
+    def test_incremental_equals_full(self):
+        self.write(self.records[:40])
+        for simulation_id in [1, 2, 3]:
+            Signal("BTC", simulation_id).update_signal()
+        # the last computed candle is replaced and 20 are added
+        self.write([dict(self.records[39], close="3333.33")] + self.records[40:])
+
+        for simulation_id in [1, 2, 3]:
+            Signal("BTC", simulation_id).update_signal(mode="incremental")
+            incremental = self.results(simulation_id)
+            Signal("BTC", simulation_id).update_signal()
+            self.assertEqual(incremental, self.results(simulation_id), f"simulation {simulation_id}")
+            self.assertTrue(incremental[1])
+
+        # an explicit start in the middle of the history
+        for simulation_id in [1, 2, 3]:
+            full = self.results(simulation_id)
+            Signal("BTC", simulation_id).update_signal(mode="incremental", start="2019-01-23")
+            self.assertEqual(self.results(simulation_id), full, f"simulation {simulation_id}")
+
+
+class SnapshotTests(TestCase):
+
+    def test_publish_two_files(self):
+        directory = tempfile.mkdtemp()
+        source_path = os.path.join(directory, 'db.sqlite3')
+        replica_path = os.path.join(directory, 'db_replica.sqlite3')
+        databases = {'default': {**settings.DATABASES['default'], 'NAME': source_path},
+                     'replica': {**settings.DATABASES['replica'], 'NAME': replica_path}}
+        try:
+            source = sqlite3.connect(source_path)
+            source.execute("CREATE TABLE candle (close TEXT)")
+            source.execute("INSERT INTO candle VALUES ('3980.93')")
+            source.commit()
+            with mock.patch.dict(settings.DATABASES, databases):
+                self.assertEqual(publish_snapshot(), replica_path)
+                # uncommitted rows are not part of the snapshot
+                source.execute("INSERT INTO candle VALUES ('1.5')")
+                self.assertEqual(publish_snapshot(), replica_path)
+                source.commit()
+                replica = sqlite3.connect(replica_path)
+                self.assertEqual(replica.execute("SELECT close FROM candle").fetchall(), [('3980.93',)])
+                replica.close()
+
+                publish_snapshot()
+                replica = sqlite3.connect(replica_path)
+                self.assertEqual(replica.execute("SELECT close FROM candle").fetchall(), [('3980.93',), ('1.5',)])
+                replica.close()
+            source.close()
+        finally:
+            shutil.rmtree(directory, ignore_errors=True)
+
+    def test_publish_once_on_success(self):
+        @publishes_snapshot
+        def inner(request, status_code=202):
+            return JsonResponse({"status_code": status_code})
+
+        @publishes_snapshot
+        def outer(request, status_code=202):
+            inner(request)
+            inner(request)
+            return JsonResponse({"status_code": status_code})
+
+        @publishes_snapshot
+        def broken(request):
+            raise ValueError("write failed")
+
+        factory = RequestFactory()
+        with mock.patch.object(db_router, 'publish_snapshot') as publish:
+            outer(factory.patch('/update/1/signal'))
+            self.assertEqual(publish.call_count, 1)
+            outer(factory.patch('/update/1/signal'), status_code=409)
+            outer(factory.post('/load/trends'), status_code=400)
+            outer(factory.get('/update/1/signal'))
+            with self.assertRaises(ValueError):
+                broken(factory.post('/load/nomics'))
+            self.assertEqual(publish.call_count, 1)
+            inner(factory.post('/load/nomics'))
+            self.assertEqual(publish.call_count, 2)
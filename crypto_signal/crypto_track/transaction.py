@@ -1,6 +1,7 @@
 from crypto_track.models import CryptoCandle, Bank, SignalSimulation, Simulation
 from django.shortcuts import get_object_or_404
-import decimal
+from crypto_track.exact_decimal import ExactAdd, ExactMul, ExactMax, ExactMin
+from django.db.models import Count, F
 from django.contrib.auth import get_user_model
 
 
@@ -16,23 +17,33 @@ class BankTransaction():
         self.simulation = simulation
         self.currency = currency
 
-    def transaction_history(self, trader_name="admin"):
+    def transaction_history(self, trader_name="admin", start=None):
         '''
             Transaction history created for simulation subset. This is separate from self.update_signal because it always needs to go in chronological order whereas update_signal does not.
+            start (datetime): only candles from start on are simulated, continuing from the stored simulations and bank before it. Default = all candles.
         '''
         # initialize variables to be used in loop
         # we start with "SELL" because we haven't bought anything yet.
         buy_switch = "SELL"
         trader = get_user_model().objects.get_or_create(username=trader_name)[0]
         prior_sim = None
+        my_bank = None
+        loop_candles = self.candle_data.order_by('period_start')
+        old_banks = Bank.objects.filter(signal_simulation__simulation=self.simulation,
+                                        user=trader,
+                                        signal_simulation__crypto_candle__in=self.candle_data
+                                        )
+
+        seed = self.seed(trader, start) if start is not None else None
+        if seed:
+            prior_sim, my_bank, buy_switch = seed
+            loop_candles = loop_candles.filter(period_start__gte=start)
+            old_banks = old_banks.filter(signal_simulation__crypto_candle__in=loop_candles)
 
         # delete if bank object already exists, then re-create.
-        Bank.objects.filter(signal_simulation__simulation=self.simulation,
-                            user=trader,
-                            signal_simulation__crypto_candle__crypto_traded=self.currency
-                            ).delete()
+        old_banks.delete()
 
-        for candle in self.candle_data.order_by('period_start_timestamp'):
+        for candle in loop_candles:
 
             try:
                 sim = get_object_or_404(SignalSimulation,
@@ -48,7 +59,7 @@ class BankTransaction():
                     my_bank = Bank(signal_simulation=sim,
                                    user=trader,
                                    # crypto_bank=(0.0),
-                                   cash_bank='1.0')
+                                   cash_bank=1)
                     my_bank.save()
                 elif sim.signal:
                     # Remove HOLD signal, make sure it copies signal from prior day
@@ -67,6 +78,22 @@ class BankTransaction():
                 prior_sim = sim
         return my_bank
 
+    def seed(self, trader, start):
+        '''
+            Returns the loop state of transaction_history after the last candle before start: (last simulation, last bank, signal of the last transaction), or None if nothing was simulated before start.
+            The bank is read back with every digit it was saved with (see ExactDecimalField), so the history continues with the same balances a full run has in memory.
+        '''
+        earlier = SignalSimulation.objects.filter(simulation=self.simulation,
+                                                  crypto_candle__in=self.candle_data.filter(period_start__lt=start)
+                                                  ).order_by('crypto_candle__period_start')
+        prior_sim = earlier.last()
+        my_bank = Bank.objects.filter(signal_simulation__in=earlier, user=trader).order_by('signal_simulation__crypto_candle__period_start').last()
+        if prior_sim is None or my_bank is None:
+            return None
+        # the first simulation only opens the bank, every later one with a signal sets buy_switch (HOLD signals are already replaced).
+        buy_switch = earlier.exclude(pk=earlier.first().pk).exclude(signal__isnull=True).exclude(signal="").values_list('signal', flat=True).last()
+        return prior_sim, my_bank, buy_switch or "SELL"
+
     def create_transaction(self, my_sim, prior_signal, trader, prior_bank):
         '''
             This is a basic model:
@@ -80,14 +107,14 @@ class BankTransaction():
             if my_sim.signal == "BUY":
                 my_bank = Bank(signal_simulation=my_sim,
                                user=trader,
-                               crypto_bank=str(decimal.Decimal(prior_bank.cash_bank) / decimal.Decimal(my_sim.crypto_candle.period_close)),
-                               cash_bank=str(0.0))
+                               crypto_bank=prior_bank.cash_bank / my_sim.crypto_candle.period_close,
+                               cash_bank=0)
                 buy_switch = "BUY"
             elif my_sim.signal == "SELL":
                 my_bank = Bank(signal_simulation=my_sim,
                                user=trader,
-                               crypto_bank=str(0.0),
-                               cash_bank=str(decimal.Decimal(prior_bank.crypto_bank) * decimal.Decimal(my_sim.crypto_candle.period_close)))
+                               crypto_bank=0,
+                               cash_bank=prior_bank.crypto_bank * my_sim.crypto_candle.period_close)
                 buy_switch = "SELL"
             my_bank.save()
 
@@ -96,3 +123,26 @@ class BankTransaction():
             buy_switch = my_sim.signal
 
         return (my_bank, buy_switch)
+
+    def equity_summary(self, trader_name="admin"):
+        '''
+            Summarizes the bank history of this simulation over candle_data (one market: currency, quote, interval and source). Equity (cash_bank + crypto_bank at the candle close price) is computed by the database, on the exact balances.
+
+            Return value:
+            Dictionary with number of transactions, starting, final, highest and lowest equity and pnl (final - starting), or None if there is no bank history.
+        '''
+        equity = ExactAdd(F('cash_bank'), ExactMul(F('crypto_bank'), F('signal_simulation__crypto_candle__period_close')))
+        history = Bank.objects.filter(signal_simulation__simulation=self.simulation,
+                                      user__username=trader_name,
+                                      signal_simulation__crypto_candle__in=self.candle_data
+                                      ).annotate(equity=equity)
+
+        summary = history.aggregate(transactions=Count('id'), max_equity=ExactMax('equity'), min_equity=ExactMin('equity'))
+        if not summary['transactions']:
+            return None
+
+        ordered = history.order_by('signal_simulation__crypto_candle__period_start').values_list('equity', flat=True)
+        summary['starting_equity'] = ordered.first()
+        summary['final_equity'] = ordered.last()
+        summary['pnl'] = summary['final_equity'] - summary['starting_equity']
+        return summary
@@ -1,46 +1,156 @@
 from pytrends.request import TrendReq
+from concurrent.futures import ThreadPoolExecutor
+from django.db import transaction
+import datetime
+import decimal
 import pandas as pd
 import sqlite3
+import threading
 from crypto_track.models import PyTrends
+from crypto_track.candle_store import CandleStore
+from crypto_track.response_cache import response_cache
 from crypto_track.stocker import Prophet
 
 
 class CryptoTrends:
 
-    def __init__(self, search_val1, search_val2):
+    # replaced by a stub when testing without network access.
+    request_class = TrendReq
+
+    def __init__(self, search_val1, search_val2, max_workers=4):
         '''
             Attributes:
             search_val1 (str): first search string to track using Google Trends
             search_val2 (str): second search string to track using Google Trends
+            max_workers (int): maximum number of periods requested from Google Trends at the same time. Default = 4
         '''
         self.search_val1 = search_val1
         self.search_val2 = search_val2
+        self.max_workers = max_workers
+        self.local = threading.local()
 
-    def get_trends(self, period):
+    def get_trends(self, period, get_client=None):
         '''
-            Gets raw data from Google Trend's "Interest Over Time" chart for the given period.
+            Gets raw data from Google Trend's "Interest Over Time" chart for the given period, from the response cache when we already have it.
 
             Attributes:
             period (str): the period to evaluate in "Interest Over Time" chart.
+            get_client (function): returns the TrendReq client to use. A new one is created if not given.
         '''
         kw_list = [self.search_val1, self.search_val2]
-        pytrends = TrendReq(hl='en - US')
-        pytrends.build_payload(kw_list, cat=0, timeframe=period, geo='', gprop='')
+        cache_params = {'kw_list': kw_list, 'timeframe': period}
+
+        df = response_cache.get('google_trends', 'interest_over_time', cache_params)
+        if df is None:
+            pytrends = get_client() if get_client else self.request_class(hl='en - US')
+            pytrends.build_payload(kw_list, cat=0, timeframe=period, geo='', gprop='')
+            df = pytrends.interest_over_time()
+            # periods that end before today will not change anymore.
+            response_cache.set('google_trends', 'interest_over_time', cache_params, df,
+                               expires=response_cache.includes_today(period.split(' ')[-1]))
+
+        return df
+
+    def get_trends_threaded(self, period):
+        '''
+            Same as get_trends but re-uses one client per worker thread (TrendReq keeps the payload of the last request so it cannot be shared between threads, but creating one costs an extra round trip for the Google cookie).
+        '''
+        return self.get_trends(period, self.thread_client)
+
+    def thread_client(self):
+        if getattr(self.local, 'pytrends', None) is None:
+            self.local.pytrends = self.request_class(hl='en - US')
+
+        return self.local.pytrends
+
+    def trend_periods(self, end_date, first_date=datetime.date(2013, 1, 1), days=180):
+        '''
+            Returns list of "yyyy-mm-dd yyyy-mm-dd" periods of the given number of days, from end_date backwards to first_date.
+            We use 6 month periods because Google Trends will aggregate the dates to weekly summary if we pull a longer timespan.
+        '''
+        periods = []
+        start_date = end_date - datetime.timedelta(days=days)
+        while end_date >= first_date:
+            if start_date < first_date:
+                start_date = first_date
+            periods.append(f"{start_date} {end_date}")
+            end_date = start_date - datetime.timedelta(days=1)
+            start_date = start_date - datetime.timedelta(days=days)
+
+        return periods
+
+    def load_periods(self, periods):
+        '''
+            Gets all periods concurrently and loads them into PyTrends with one bulk write.
+
+            Return value:
+            Number of dates loaded.
+        '''
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            frames = list(executor.map(self.get_trends_threaded, periods))
+
+        frames = [df for df in frames if not df.empty]
+        if not frames:
+            return 0
+
+        return self.save_frame(pd.concat(frames))
+
+    def trend_frame(self, df):
+        '''
+            Converts the Google Trends data frame (indexed by date) into PyTrends columns.
+            trend_ratio is buy_bitcoin / btc_usd computed on the whole column, it is left null where btc_usd is 0.
+        '''
+        df = df[~df.index.duplicated(keep='last')]
+        trend_df = pd.DataFrame({'date': df.index.date,
+                                 'buy_bitcoin': df[self.search_val1].values,
+                                 'btc_usd': df[self.search_val2].values,
+                                 'is_partial': df['isPartial'].astype(bool).values
+                                 })
+        has_btc_usd = trend_df.btc_usd.abs() > 0
+        trend_df['trend_ratio'] = (trend_df.buy_bitcoin / trend_df.btc_usd.where(has_btc_usd)).astype(object).where(has_btc_usd, None)
+
+        # Round the ratio the same way the DecimalField stores it, so we can tell which rows actually changed.
+        ratio_field = PyTrends._meta.get_field('trend_ratio')
+        ratio_places = decimal.Decimal(1).scaleb(-ratio_field.decimal_places)
+        trend_df['trend_ratio'] = [None if ratio is None else ratio_field.to_python(ratio).quantize(ratio_places)
+                                   for ratio in trend_df.trend_ratio.tolist()]
+
+        return trend_df
+
+    def save_frame(self, df):
+        '''
+            Upserts a PyTrends record for every row in the Google Trends data frame (indexed by date) within one transaction: new dates are bulk inserted, existing dates are only updated when a value changed.
+            Existing dates are never deleted so CryptoCandle.search_trend links are kept.
+        '''
+        trend_df = self.trend_frame(df)
+        columns = ['buy_bitcoin', 'btc_usd', 'is_partial', 'trend_ratio']
+        trend_records = {record['date']: record for record in trend_df.to_dict('records')}
+
+        dates = list(trend_records)
+        existing = {}
+        for i in range(0, len(dates), 500):
+            for stored in PyTrends.objects.filter(date__in=dates[i:i + 500]).values('date', *columns):
+                existing[stored['date']] = stored
+
+        changed = 0
+        with transaction.atomic():
+            PyTrends.objects.bulk_create([PyTrends(**record) for trend_date, record in trend_records.items() if trend_date not in existing],
+                                         batch_size=500)
+            for trend_date, stored in existing.items():
+                record = trend_records[trend_date]
+                if any(record[column] != stored[column] for column in columns):
+                    PyTrends.objects.filter(date=trend_date).update(**{column: record[column] for column in columns})
+                    changed += 1
+
+        # trend ratios of linked candles are copied into the candle stores.
+        if changed:
+            CandleStore.rebuild_all()
 
-        return pytrends.interest_over_time()
+        return len(trend_records)
 
     def load_model(self, period):
         '''
             Loads data model PyTrends within SQL database.
         '''
-        df = self.get_trends(period)
-        for index, row in df.iterrows():
-            trend_record = PyTrends(date=index,
-                                    buy_bitcoin=row[self.search_val1],
-                                    btc_usd=row[self.search_val2],
-                                    is_partial=row['isPartial']
-                                    )
-            if abs(trend_record.btc_usd) > 0:
-                trend_record.trend_ratio = trend_record.buy_bitcoin / trend_record.btc_usd
-            trend_record.save()
+        self.save_frame(self.get_trends(period))
         return "Accepted"
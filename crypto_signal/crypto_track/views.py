@@ -1,20 +1,35 @@
 
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_date
 from django.utils import timezone
 from django.views import generic
+from django.views.decorators.http import condition
+from django.db.models import Max
+from django.utils.decorators import method_decorator
 import datetime
 from crypto_track.trends import CryptoTrends
-from crypto_track.models import CryptoCandle, Simulation
+from crypto_track.models import Simulation, SignalVersion
 from crypto_track.signal import Signal
+from crypto_track.transaction import BankTransaction
 from crypto_track.crypto_data import CryptoData
+from crypto_track.batch_loader import NomicsBatchLoader
+from crypto_track.rollup import CandleRollup
 from crypto_track.track_exception import TrackException
 from crypto_track.dataexport import DataExport
+from crypto_track.response_cache import response_cache
+from crypto_track.signal_cache import signal_cache
+from crypto_track.signal_range import SignalRange
+from crypto_track.recompute import SignalRecompute
+from crypto_track.sweep import ThresholdSweep, parse_grid
+from crypto_track.db_router import read_replica, replica_iterator, publishes_snapshot
 import pandas as pd
+import hashlib
 
 bad_request_default = {"status_code": 400, "status": "Bad Request",
                        "message": "Please submit a valid request."}
 
 
+@method_decorator(read_replica, name='dispatch')
 class SimulationView(generic.ListView):
     template_name = 'crypto_track/simview.html'
     context_object_name = 'all_sims_list'
@@ -23,9 +38,41 @@ class SimulationView(generic.ListView):
         return Simulation.objects.order_by('id')
 
 
+def signal_versions(request, simulation_id=None):
+    # SignalVersion rows behind a signal or signal range request.
+    currencies = [value for value in request.GET.get('currency', '').split(',') if value]
+    if simulation_id is not None:
+        simulation_ids = [simulation_id]
+    else:
+        simulation_ids = [int(value) for value in request.GET.get('simulation', '').split(',') if value.isdigit()]
+    return SignalVersion.scope(currencies, simulation_ids)
+
+
+# query params that select what a signal response holds, with the value used when they are missing
+signal_params = (('date', ''), ('quote', 'USD'), ('interval', '1d'), ('start', ''), ('end', ''), ('format', 'jsonl'))
+
+
+def signal_etag(request, simulation_id=None):
+    '''
+        ETag of a signal response: a hash of the data versions of every (simulation, currency) it reads and of the params selecting the response (so every date, quote and interval gets its own). None (no conditional response) until the data has a version.
+    '''
+    versions = sorted(signal_versions(request, simulation_id).values_list('simulation_id', 'crypto_traded', 'version'))
+    if not versions:
+        return None
+    params = [(name, request.GET.get(name) or default) for name, default in signal_params]
+    return hashlib.md5(repr((versions, params)).encode()).hexdigest()
+
+
+def signal_last_modified(request, simulation_id=None):
+    return signal_versions(request, simulation_id).aggregate(Max('update_timestamp'))['update_timestamp__max']
+
+
+@read_replica
+@condition(etag_func=signal_etag, last_modified_func=signal_last_modified)
 def signal(request, simulation_id):
     '''
         # example request: GET localhost:8000/1/signal?currency=BTC&date=yyyy-mm-dd
+        optional: interval=4h and quote=EUR read the candles of another interval or quote currency (default 1d and USD).
 
         Return value:
         Returns buy or sell of currency queried for a given date, starting from 2013 up to today. If no date is given, latest available is returned.
@@ -39,12 +86,22 @@ def signal(request, simulation_id):
         # currency is required to be given in request.
         if user_currency == "" or simulation_id == None:
             raise TrackException("Please specify a simulation ID and currency in your request.", "Bad Request")
-        my_signal = Signal(currency=user_currency, simulation_id=simulation_id)
+        user_interval = request.GET.get('interval', '1d')
 
         # Get date from request. Date is optional
         user_date = request.GET.get('date', search_date)
 
-        return_message = my_signal.get_signal(user_date)
+        my_signal = Signal(currency=user_currency,
+                           simulation_id=simulation_id,
+                           currency_quoted=request.GET.get('quote', 'USD'),
+                           period_interval=user_interval)
+        # responses only change when SignalVersion is bumped by a load or update.
+        cache_key = signal_cache.key(SignalVersion.current(simulation_id, user_currency),
+                                     simulation_id, my_signal.currency, my_signal.currency_quoted, my_signal.period_interval, user_date)
+        return_message = signal_cache.get(cache_key)
+        if return_message is None:
+            return_message = my_signal.get_signal(user_date)
+            signal_cache.set(cache_key, return_message)
     except Exception as exc:
         return JsonResponse({"status_code": 409,
                              "status": "Conflict",
@@ -54,8 +111,129 @@ def signal(request, simulation_id):
         return JsonResponse(return_message)
 
 
+@read_replica
+@condition(etag_func=signal_etag, last_modified_func=signal_last_modified)
+def signal_range(request):
+    '''
+        # example request: GET localhost:8000/signal/range?currency=BTC,ETH&simulation=1,2&start=yyyy-mm-dd&end=yyyy-mm-dd&format=csv
+
+        Return value:
+        Streams the signal of every candle date between start and end (inclusive) for the given currencies and simulations (all simulations if none given), one JSON object per line (format=jsonl, default) or as CSV (format=csv).
+    '''
+    try:
+        currencies = [value for value in request.GET.get('currency', '').split(',') if value]
+        start = parse_date(request.GET.get('start', ''))
+        end = parse_date(request.GET.get('end', ''))
+        if not currencies or start is None or end is None:
+            raise TrackException("Please specify currency, start and end (yyyy-mm-dd) in your request.", "Bad Request")
+        simulation_ids = [int(value) for value in request.GET.get('simulation', '').split(',') if value]
+        output_format = request.GET.get('format', 'jsonl')
+        if output_format not in ('jsonl', 'csv'):
+            raise TrackException(f"Unknown format {output_format}, use jsonl or csv.", "Bad Request")
+
+        my_range = SignalRange(currencies,
+                               start,
+                               end,
+                               simulation_ids=simulation_ids,
+                               period_interval=request.GET.get('interval', '1d'))
+    except Exception as exc:
+        return JsonResponse({"status_code": 409,
+                             "status": "Conflict",
+                             "type": type(exc).__name__,
+                             "message": exc.__str__()})
+
+    if output_format == 'csv':
+        response = StreamingHttpResponse(replica_iterator(my_range.csv_lines()), content_type='text/csv')
+        response['Content-Disposition'] = 'attachment; filename="signals.csv"'
+    else:
+        response = StreamingHttpResponse(replica_iterator(my_range.json_lines()), content_type='application/x-ndjson')
+    return response
+
+
+@read_replica
+def bank(request, simulation_id):
+    '''
+        # example request: GET localhost:8000/1/bank?currency=BTC&user=admin
+        optional: interval=4h and quote=EUR summarize the candles of another interval or quote currency (default 1d and USD).
+
+        Return value:
+        Returns the equity summary (transactions, starting/final/highest/lowest equity and pnl) of the bank history created by the simulation for the given currency.
+    '''
+    try:
+        user_currency = request.GET.get('currency', '')
+        if user_currency == "":
+            raise TrackException("Please specify a currency in your request.", "Bad Request")
+        my_signal = Signal(currency=user_currency,
+                           simulation_id=simulation_id,
+                           currency_quoted=request.GET.get('quote', 'USD'),
+                           period_interval=request.GET.get('interval', '1d'))
+        transaction_sim = BankTransaction(my_signal.candle_subset, my_signal.simulation_obj, user_currency)
+
+        summary = transaction_sim.equity_summary(request.GET.get('user', 'admin'))
+        if summary is None:
+            raise TrackException(f"There is no bank history for simulation {simulation_id} and {user_currency}.", "Not Found")
+    except Exception as exc:
+        return JsonResponse({"status_code": 409,
+                             "status": "Conflict",
+                             "type": type(exc).__name__,
+                             "message": exc.__str__()})
+    else:
+        return JsonResponse({"currency": user_currency, "simulation_id": simulation_id, **summary})
+
+
+@publishes_snapshot
+def sweep(request, simulation_id):
+    '''
+        Scores a grid of price/trend thresholds of simulation 1 or 3 in memory (nothing is written). PATCH with save=true also writes the signals and bank history of the best combination.
+        # example request: GET localhost:8000/1/sweep?currency=BTC&price=0:200:5&trend=0.2:0.6:0.01&top=10
+
+        Return value:
+        Returns the number of combinations and the top combinations by final equity (1 = starting cash), with max drawdown and number of trades.
+    '''
+    if request.method not in ["GET", "PATCH"]:
+        return JsonResponse(bad_request_default)
+    try:
+        user_currency = request.GET.get('currency', '')
+        if user_currency == "":
+            raise TrackException("Please specify a currency in your request.", "Bad Request")
+        if request.GET.get('price', '') == "" or request.GET.get('trend', '') == "":
+            raise TrackException("Please specify price and trend thresholds (ie. 0:200:5 or 40,80) in your request.", "Bad Request")
+
+        threshold_sweep = ThresholdSweep(currency=user_currency,
+                                         simulation_id=simulation_id,
+                                         price_thresholds=parse_grid(request.GET['price']),
+                                         trend_thresholds=parse_grid(request.GET['trend']),
+                                         period_interval=request.GET.get('interval', '1d'))
+        summary = threshold_sweep.run(top=int(request.GET.get('top', '10')))
+        confirm_message = f"Scored {summary['combinations']} combinations over {summary['candles']} candles in {summary['seconds']}s."
+
+        if request.method == "PATCH" and request.GET.get('save', '') == "true":
+            best = summary['results'][0]
+            confirm_message += ' ' + threshold_sweep.save(best['price_threshold'], best['trend_threshold'])
+    except Exception as exc:
+        return JsonResponse({"status_code": 409,
+                             "status": "Conflict",
+                             "type": type(exc).__name__,
+                             "message": exc.__str__()})
+    else:
+        return JsonResponse({"status_code": 200, "status": "OK",
+                             "message": confirm_message,
+                             "results": summary['results']})
+
+
+def cache_stats(request):
+    '''
+        Returns hit/miss counters of the signal response cache and the upstream response cache of this process.
+        sample: GET localhost:8000/cache/stats
+    '''
+    return JsonResponse({"signal": signal_cache.stats(),
+                         "response": response_cache.stats()})
+
+
+@publishes_snapshot
 def load_nomics(request):
     # example request: POST localhost:8000/load/nomics?currency=BTC
+    # optional: interval=1h loads hourly candles (4h and 1d are then rolled up from them, see settings.ROLLUP_INTERVALS).
     try:
         query_currency = request.GET.get('currency', '')
         if query_currency == "" or request.method != "POST":
@@ -63,17 +241,78 @@ def load_nomics(request):
     except:
         return JsonResponse(bad_request_default)
     else:
-        my_data = CryptoData(currency=query_currency, request=request)
+        my_data = CryptoData(currency=query_currency,
+                             request=request,
+                             period_interval=request.GET.get('interval', '1d'))
         return_message = my_data.get_nomics()
 
     return return_message
 
 
+@publishes_snapshot
+def load_nomics_batch(request):
+    '''
+        Loads Nomics candles for a comma separated list of currencies concurrently. Defaults to mode=incremental, also accepts start/end like /load/nomics.
+        sample: POST localhost:8000/load/nomics/batch?currency=BTC,ETH,LTC&workers=8
+    '''
+    query_currency = request.GET.get('currency', '')
+    if query_currency == "" or request.method != "POST":
+        return JsonResponse(bad_request_default)
+
+    try:
+        currencies = [currency.strip() for currency in query_currency.split(',') if currency.strip()]
+        options = request.GET.dict()
+        options.setdefault('mode', 'incremental')
+        loader = NomicsBatchLoader(currencies,
+                                   options=options,
+                                   max_workers=int(request.GET.get('workers', '8'))
+                                   )
+        results = loader.load()
+    except Exception as exc:
+        return JsonResponse({"status_code": 409,
+                             "status": "Conflict",
+                             "type": type(exc).__name__,
+                             "message": exc.__str__()})
+
+    return JsonResponse({"status_code": 202, "status": "Accepted",
+                         "message": f"Loaded {len(currencies)} currencies on {timezone.now()}.",
+                         "results": results,
+                         "cache": response_cache.stats()}
+                        )
+
+
+@publishes_snapshot
 def load_ccxt(request):
-    # Placeholder
-    pass
+    '''
+        Loads candles from any exchange supported by ccxt, every combination of exchange, market and interval is fetched concurrently. Optional since=yyyy-mm-dd is used when there is no stored history for that exchange.
+        sample: POST localhost:8000/load/ccxt?exchange=kraken,bitstamp&market=BTC/USD,ETH/USD&interval=1d
+    '''
+    exchange_ids = [value for value in request.GET.get('exchange', '').split(',') if value]
+    markets = [value for value in request.GET.get('market', '').split(',') if value]
+    intervals = [value for value in request.GET.get('interval', '1d').split(',') if value]
+    if not exchange_ids or not markets or request.method != "POST":
+        return JsonResponse(bad_request_default)
 
+    try:
+        # ccxt is only needed by this endpoint
+        from crypto_track.exchange_loader import ExchangeLoader, build_jobs
+        loader = ExchangeLoader(build_jobs(exchange_ids, markets, intervals),
+                                since=request.GET.get('since', '2013-01-01')
+                                )
+        stats = loader.load()
+    except Exception as exc:
+        return JsonResponse({"status_code": 409,
+                             "status": "Conflict",
+                             "type": type(exc).__name__,
+                             "message": exc.__str__()})
+
+    return JsonResponse({"status_code": 202, "status": "Accepted",
+                         "message": f"Fetched {stats['fetched']} candles at {stats['fetch_candles_per_second']} candles/sec on {timezone.now()}.",
+                         **stats}
+                        )
 
+
+@publishes_snapshot
 def load_trends(request):
     '''
         Used to populate PyTrends model from Google Trend data.
@@ -82,52 +321,43 @@ def load_trends(request):
     '''
 
     if request.method == "POST":
-        my_trend = CryptoTrends('buy bitcoin', 'BTC USD')
-
-        end_date = datetime.datetime.now().date()
-        start_date = end_date - datetime.timedelta(days=180)
+        try:
+            my_trend = CryptoTrends('buy bitcoin', 'BTC USD', max_workers=int(request.GET.get('workers', '4')))
 
-        # Iterate over a 6 month period because model will aggregate the dates to weekly summary if we try to pull a longer timespan.
-        while end_date.year >= 2013:
             # We do not need any data before 2013, this is how far our historical data for bitcoin spans.
-            if start_date < datetime.date(2013, 1, 1):
-                start_date = datetime.date(2013, 1, 1)
-
-            try:
-                # Load google trend data into database.
-                status_message = my_trend.load_model(f"{start_date} {end_date}")
-            except Exception as exc:
-                return JsonResponse({"status_code": 409,
-                                     "status": "Conflict",
-                                     "type": type(exc).__name__,
-                                     "message": exc.__str__()})
-            else:
-                # re-assign start and end dates to shift 6 months backwards.
-                end_date = start_date - datetime.timedelta(days=1)
-                start_date = start_date - datetime.timedelta(days=180)
+            periods = my_trend.trend_periods(datetime.datetime.now().date(), first_date=datetime.date(2013, 1, 1))
+
+            # Load google trend data into database, all 6 month periods are requested concurrently.
+            loaded = my_trend.load_periods(periods)
+        except Exception as exc:
+            return JsonResponse({"status_code": 409,
+                                 "status": "Conflict",
+                                 "type": type(exc).__name__,
+                                 "message": exc.__str__()})
 
         # whenever we load raw data, we want to update its signal
         update_candles(request)
 
-        return JsonResponse({"status_code": 202, "status": status_message})
+        return JsonResponse({"status_code": 202, "status": "Accepted",
+                             "message": f"Loaded {loaded} dates from {len(periods)} periods on {timezone.now()}.",
+                             "cache": response_cache.stats()}
+                            )
     else:
         return JsonResponse(bad_request_default)
 
 
+@publishes_snapshot
 def update_candles(request):
     '''
-        Updates search_trend for all candle data. We can use this if we have already loaded candle data but need to update the trend relationship on its own.
+        Updates search_trend for all candle data of the currency (all candles if currency is blank). We can use this if we have already loaded candle data but need to update the trend relationship on its own.
         sample: PATCH localhost:8000/update/candles?currency=BTC
     '''
     query_currency = request.GET.get('currency', '')
 
     if request.method in ("POST", "PATCH"):
-        x = 0
-        for candle in CryptoCandle.objects.all():
-            my_data = CryptoData(currency=query_currency, request=request)
-            find_trend = my_data.append_trend_dates(candle)
-            if find_trend:
-                x += 1
+        # one UPDATE for every candle of the currency (all candles if no currency is given)
+        my_data = CryptoData(currency=query_currency, request=request)
+        x = my_data.link_trends()
 
         # whenever we load raw data, we want to update its signal
         update_signal(request)
@@ -138,12 +368,54 @@ def update_candles(request):
         return JsonResponse(bad_request_default)
 
 
+@publishes_snapshot
+def update_rollups(request):
+    '''
+        Recomputes all rollup candles of a currency from its base interval candles. Rollups are normally kept up to date as base candles are written, use this after changing settings.ROLLUP_INTERVALS.
+        sample: PATCH localhost:8000/update/rollups?currency=BTC&base=1h&interval=4h,1d&source=nomics
+    '''
+    if request.method in ("POST", "PATCH"):
+        try:
+            user_currency = request.GET.get('currency', '')
+            base_interval = request.GET.get('base', '1h')
+            intervals = [value for value in request.GET.get('interval', '').split(',') if value]
+            if user_currency == "" or not intervals:
+                raise TrackException("Please specify a currency and at least one interval in your request.", "Bad Request")
+
+            rollup = CandleRollup.for_source(user_currency,
+                                             request.GET.get('source', 'nomics'),
+                                             currency_quoted=request.GET.get('quote', 'USD'),
+                                             base_interval=base_interval)
+            if rollup is None:
+                raise TrackException(f"There are no {base_interval} candles for {user_currency}.", "Not Found")
+
+            results = {}
+            for period_interval in intervals:
+                inserted, updated = rollup.run(period_interval)
+                results[period_interval] = {"inserted": inserted, "updated": updated}
+        except Exception as exc:
+            return JsonResponse({"status_code": 409,
+                                 "status": "Conflict",
+                                 "type": type(exc).__name__,
+                                 "message": exc.__str__()})
+        else:
+            return JsonResponse({"status_code": 202, "status": "Accepted",
+                                 "message": f"Rolled up {base_interval} candles on {timezone.now()}.",
+                                 "results": results})
+    else:
+        return JsonResponse(bad_request_default)
+
+
+@publishes_snapshot
 def update_signal(request, simulation_id=""):
     '''
         Updates signal and prior_period_candle for all candle objects. We can use this if we have already loaded candle data but need to update the values on its own.
         Note: simulation_id is optional, if none is given, all Simulations will be re-calculated (should be used when we re-load the source, then we need to re-calculate all Sims).
-        sample: PATCH localhost:8000/update/1/signal?currency=BTC
+        sample: PATCH localhost:8000/update/1/signal?currency=BTC&engine=loop
+        sample: PATCH localhost:8000/update/signal?currency=BTC,ETH&workers=8
     '''
+    if request.method == "PATCH" and simulation_id == "":
+        return update_signal_all(request)
     if request.method == "PATCH":
         try:
             # initiate variables
@@ -155,11 +427,17 @@ def update_signal(request, simulation_id=""):
                 raise TrackException("Please specify a currency in your request.", "Bad Request")
 
             else:
-                my_signal = Signal(currency=user_currency, simulation_id=simulation_id)
+                my_signal = Signal(currency=user_currency,
+                                   simulation_id=simulation_id,
+                                   period_interval=request.GET.get('interval', '1d'))
                 # Get prediction days from request (this is necessary only starting with sim id 4)
                 my_signal.prediction_days = int(request.GET.get('days', '90'))
 
-                confirm_message = my_signal.update_signal()
+                # engine=loop calculates signals one candle at a time (default vector calculates them all at once).
+                # mode=incremental only recomputes candles from start (default = the last candle with a signal) on.
+                confirm_message = my_signal.update_signal(engine=request.GET.get('engine', 'vector'),
+                                                          mode=request.GET.get('mode', 'full'),
+                                                          start=request.GET.get('start'))
 
         except Exception as exc:
             return JsonResponse({"status_code": 409,
@@ -176,6 +454,30 @@ def update_signal(request, simulation_id=""):
         return JsonResponse(bad_request_default)
 
 
+def update_signal_all(request):
+    '''
+        Recalculates every simulation for the given currencies (all currencies when blank) in a pool of worker processes.
+    '''
+    try:
+        recompute = SignalRecompute(currencies=[value for value in request.GET.get('currency', '').split(',') if value],
+                                    options={'interval': request.GET.get('interval', '1d'),
+                                             'engine': request.GET.get('engine', 'vector'),
+                                             'mode': request.GET.get('mode', 'full'),
+                                             'days': int(request.GET.get('days', '90'))},
+                                    max_workers=int(request.GET['workers']) if request.GET.get('workers') else None)
+        summary = recompute.run()
+    except Exception as exc:
+        return JsonResponse({"status_code": 409,
+                             "status": "Conflict",
+                             "type": type(exc).__name__,
+                             "message": exc.__str__()})
+    return JsonResponse({"status_code": 202, "status": "Accepted",
+                         "message": f"Recalculated {len(summary['results'])} simulations in {summary['seconds']}s on {timezone.now()}.",
+                         "results": summary['results']}
+                        )
+
+
+@publishes_snapshot
 def load_simulations(request):
     '''
         Accepts a POST request to load crypto_track_simulation table from excel file crypto_signal/crypto_track/CryptoSimulations.xlsx
@@ -206,6 +508,7 @@ def load_simulations(request):
         return JsonResponse(bad_request_default)
 
 
+@read_replica
 def data_export(request, format='csv'):
     '''
         Accepts a POST or PATCH request to load all django models into flat files. This can be used for many purposes, but initially meant to load Tableau report.